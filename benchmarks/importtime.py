@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Measure the import cost of each ``dhaffner`` module with ``python -X
+importtime`` and fail if any module exceeds its budget.
+
+Each module is imported in a fresh interpreter ``--repeat`` times and the
+fastest run is kept, which filters out most of the noise from a cold disk
+cache. Budgets are in microseconds of cumulative import time (i.e. including
+everything the module pulls in that the bare interpreter had not already
+loaded) and can be scaled for slow machines with ``--scale``.
+
+    python benchmarks/importtime.py [--repeat 5] [--scale 1.0] [--json]
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+
+# Cumulative import time budget for each module, in microseconds. Most of
+# the submodule budget is taken up by ``six``.
+THRESHOLDS = {
+    'dhaffner': 3000,
+    'dhaffner.builtins': 30000,
+    'dhaffner.common': 30000,
+    'dhaffner.functions': 35000,
+    'dhaffner.iterators': 30000,
+    'dhaffner.misc': 30000,
+    'dhaffner.profiling': 15000,
+}
+
+# Modules that must not be imported as a side effect of importing the key.
+FORBIDDEN = {
+    'dhaffner': ('dhaffner.builtins', 'dhaffner.common', 'dhaffner.functions',
+                 'dhaffner.iterators', 'dhaffner.misc',
+                 'dhaffner.profiling'),
+    'dhaffner.builtins': ('dhaffner.functions',),
+    'dhaffner.iterators': ('dhaffner.common', 'dhaffner.functions',
+                           'dhaffner.iterators.combinatorics',
+                           'dhaffner.iterators.ordering',
+                           'dhaffner.iterators.records',
+                           'dhaffner.iterators.replaying',
+                           'dhaffner.iterators.sampling'),
+    'dhaffner.functions': ('inspect', 'random', 'threading',
+                           'dhaffner.functions.batching',
+                           'dhaffner.functions.pooling'),
+}
+
+_line = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$')
+
+
+def importtime(module, executable=sys.executable):
+    """Import module in a fresh interpreter; return a dict mapping each
+    newly imported module to its (self, cumulative) time in microseconds.
+    """
+    proc = subprocess.run(
+        [executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = _line.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module, repeat=5):
+    """Return (best cumulative time, imported module names) for module."""
+    runs = [importtime(module) for _ in range(repeat)]
+    best = min(run[module][1] for run in runs)
+    return best, set(runs[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply every budget by this factor')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results, failures = {}, []
+    for module, budget in sorted(THRESHOLDS.items()):
+        budget = int(budget * args.scale)
+        best, imported = measure(module, args.repeat)
+        leaked = sorted(imported.intersection(FORBIDDEN.get(module, ())))
+        results[module] = {'us': best, 'budget_us': budget, 'leaked': leaked}
+        if best > budget:
+            failures.append('{}: {}us > {}us'.format(module, best, budget))
+        if leaked:
+            failures.append('{}: imports {}'.format(module, ', '.join(leaked)))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        for module, result in sorted(results.items()):
+            print('{:<22} {:>8}us  (budget {}us)'.format(
+                module, result['us'], result['budget_us']))
+
+    for failure in failures:
+        print('REGRESSION ' + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,889 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for every public helper in ``dhaffner``.
+
+Each case measures per-call latency with ``timeit``, throughput in items per
+second for the given input size, and peak memory allocated during one call
+with ``tracemalloc``. Where the standard library offers an equivalent, the
+same input is also run through that baseline so the overhead of the helper
+is visible. Results are written as JSON so that two runs can be diffed:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --compare before.json
+
+Run ``--check`` to list public helpers that have no benchmark, and
+``--max-ratio R`` to fail when a case is more than R times slower than its
+baseline, e.g. the combinators against the closures they replaced:
+
+    python benchmarks/suite.py -k '^functions' --max-ratio 2
+"""
+
+import argparse
+import functools
+import json
+import operator
+import os
+import platform
+import re
+import sys
+import timeit
+import tracemalloc
+
+from collections import deque, namedtuple
+from functools import partial
+from itertools import accumulate, chain, combinations, islice, tee
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import dhaffner  # noqa: E402
+from dhaffner import builtins, common, functions, iterators, misc
+
+
+MODULES = ('builtins', 'common', 'functions', 'iterators', 'misc')
+
+SIZES = (10, 1000, 100000)
+
+SCALAR = (1,)
+
+Case = namedtuple('Case', 'module name setup sizes baseline')
+
+CASES = []
+
+exhaust = deque(maxlen=0).extend
+
+
+def bench(module, name, sizes=SIZES, baseline=None):
+    """Register a benchmark. The decorated function takes an input size n and
+    returns a zero-argument callable that performs (and fully consumes) one
+    call of the helper. baseline is an optional (label, setup) pair.
+    """
+    def decorator(setup):
+        CASES.append(Case(module, name, setup, sizes, baseline))
+        return setup
+
+    return decorator
+
+
+#
+#   dhaffner.iterators
+#
+
+
+def _step(x):
+    return (x * x + 1) % 1009
+
+
+def _halve(x):
+    return x // 2
+
+
+@bench('iterators', 'compact',
+       baseline=('filter(None)', lambda n: partial(
+           lambda data: exhaust(filter(None, data)), [0, 1] * (n // 2))))
+def _(n):
+    data = [0, 1] * (n // 2)
+    return lambda: exhaust(iterators.compact(data))
+
+
+@bench('iterators', 'cons',
+       baseline=('itertools.chain', lambda n: lambda: exhaust(
+           chain((0,), range(n)))))
+def _(n):
+    return lambda: exhaust(iterators.cons(0, range(n)))
+
+
+@bench('iterators', 'consume')
+def _(n):
+    return lambda: iterators.consume(iter(range(n)), n // 2)
+
+
+@bench('iterators', 'dotproduct',
+       baseline=('sum(map(mul))', lambda n: partial(
+           lambda v: sum(map(operator.mul, v, v)), list(range(n)))))
+def _(n):
+    v1, v2 = list(range(n)), list(range(n))
+    return lambda: iterators.dotproduct(v1, v2)
+
+
+@bench('iterators', 'dotproducts', sizes=(10, 100, 1000),
+       baseline=('sum(map(mul)) per row', lambda n: partial(
+           lambda m, v: [sum(map(operator.mul, row, v)) for row in m],
+           [[float(i)] * 1000 for i in range(n)], [1.0] * 1000)))
+def _(n):
+    matrix, vector = [[float(i)] * 1000 for i in range(n)], [1.0] * 1000
+    return partial(iterators.dotproducts, matrix, vector)
+
+
+@bench('iterators', 'merge',
+       baseline=('sorted(chain())', lambda n: partial(
+           lambda a, b: sorted(chain(a, b)),
+           list(range(0, n, 2)), list(range(1, n, 2)))))
+def _(n):
+    a, b = list(range(0, n, 2)), list(range(1, n, 2))
+    return lambda: exhaust(iterators.merge(a, b))
+
+
+@bench('iterators', 'merge_unique',
+       baseline=('sorted(set())', lambda n: partial(
+           lambda a, b: sorted(set(a).union(b)),
+           list(range(0, n, 2)), list(range(0, n, 3)))))
+def _(n):
+    a, b = list(range(0, n, 2)), list(range(0, n, 3))
+    return lambda: exhaust(iterators.merge_unique(a, b))
+
+
+@bench('iterators', 'merge_join',
+       baseline=('dict lookup', lambda n: partial(
+           lambda a, b: exhaust((x, y) for y in b for x in a.get(y, ())),
+           dict((i, [i]) for i in range(0, n, 2)), list(range(0, n, 3)))))
+def _(n):
+    a, b = list(range(0, n, 2)), list(range(0, n, 3))
+    return lambda: exhaust(iterators.merge_join(a, b))
+
+
+@bench('iterators', 'most_similar', sizes=(10, 100, 1000))
+def _(n):
+    matrix, vector = [[float(i)] * 1000 for i in range(n)], [1.0] * 1000
+    return partial(iterators.most_similar, matrix, vector, 10)
+
+
+@bench('iterators', 'drop',
+       baseline=('itertools.islice', lambda n: lambda: exhaust(
+           islice(range(n), 1, None))))
+def _(n):
+    return lambda: exhaust(iterators.drop(range(n), 1))
+
+
+@bench('iterators', 'exhaust')
+def _(n):
+    return lambda: iterators.exhaust(range(n))
+
+
+@bench('iterators', 'first', sizes=SCALAR,
+       baseline=('next(iter())', lambda n: partial(
+           lambda data: next(iter(data)), [1] * n)))
+def _(n):
+    data = [1] * n
+    return lambda: iterators.first(data)
+
+
+def _shuffled(n):
+    return [i * 7919 % n for i in range(n)]
+
+
+def _records(n):
+    return [{'id': i % 100, 'x': i} for i in range(max(n, 1))]
+
+
+def _index(records):
+    index = {}
+    for r in records:
+        index.setdefault(r['id'], []).append(r)
+    return index
+
+
+def _hand_join(build, probe):
+    index = _index(build)
+    exhaust(dict(m, **r) for r in probe for m in index.get(r['id'], ()))
+
+
+def _group(records):
+    groups = {}
+    for r in records:
+        groups.setdefault(r['id'], []).append(r['x'])
+    return groups
+
+
+def _recursive_flatten(iterable):
+    for item in iterable:
+        if isinstance(item, (list, tuple)):
+            for x in _recursive_flatten(item):
+                yield x
+        else:
+            yield item
+
+
+def _broad(n):
+    return [[[i, (i, i)], [i]] for i in range(n // 4)]
+
+
+def _deep(n):
+    deep = [0]
+    for i in range(1, min(n, 500)):  # deeper would overflow the baseline
+        deep = [deep, i]
+    return [deep] * max(1, n // 500)
+
+
+@bench('iterators', 'flatten',
+       baseline=('chain.from_iterable', lambda n: partial(
+           lambda data: exhaust(chain.from_iterable(data)),
+           [[0] * 10] * (n // 10))))
+def _(n):
+    data = [[0] * 10] * (n // 10)
+    return lambda: exhaust(iterators.flatten(data, 1))
+
+
+@bench('iterators', 'flatten (broad)',
+       baseline=('recursive generator', lambda n: partial(
+           lambda data: exhaust(_recursive_flatten(data)), _broad(n))))
+def _(n):
+    data = _broad(n)
+    return lambda: exhaust(iterators.flatten(data))
+
+
+@bench('iterators', 'flatten (deep)',
+       baseline=('recursive generator', lambda n: partial(
+           lambda data: exhaust(_recursive_flatten(data)), _deep(n))))
+def _(n):
+    data = _deep(n)
+    return lambda: exhaust(iterators.flatten(data))
+
+
+@bench('iterators', 'hash_join',
+       baseline=('dict of lists', lambda n: partial(
+           _hand_join, _records(n // 10), _records(n))))
+def _(n):
+    build, probe = _records(n // 10), _records(n)
+    return lambda: exhaust(iterators.hash_join(build, probe, 'id'))
+
+
+@bench('iterators', 'group_aggregate',
+       baseline=('dict of lists', lambda n: partial(
+           lambda rows: [(k, sum(v)) for k, v in _group(rows).items()],
+           _records(n))))
+def _(n):
+    rows = _records(n)
+    return lambda: exhaust(iterators.group_aggregate(rows, 'id',
+                                                     {'x': 'sum'}))
+
+
+@bench('iterators', 'ilen',
+       baseline=('len(list())', lambda n: lambda: len(list(range(n)))))
+def _(n):
+    return lambda: iterators.ilen(range(n))
+
+
+@bench('iterators', 'isiterable', sizes=SCALAR)
+def _(n):
+    return lambda: iterators.isiterable(n)
+
+
+@bench('iterators', 'iterate')
+def _(n):
+    return lambda: exhaust(islice(iterators.iterate(abs, -1), n))
+
+
+@bench('iterators', 'iterate_n',
+       baseline=('iterate + islice', lambda n: lambda: deque(
+           islice(iterators.iterate(_step, 3), n), maxlen=1).pop()))
+def _(n):
+    return partial(iterators.iterate_n, _step, 3, n, detect=True)
+
+
+@bench('iterators', 'find_cycle', sizes=SCALAR)
+def _(n):
+    return partial(iterators.find_cycle, _step, 3)
+
+
+@bench('iterators', 'until_fixed_point', sizes=SCALAR)
+def _(n):
+    return partial(iterators.until_fixed_point, _halve, 2 ** 62)
+
+
+@bench('iterators', 'last',
+       baseline=('deque(maxlen=1)', lambda n: lambda: deque(
+           range(n), maxlen=1).pop()))
+def _(n):
+    return lambda: iterators.last(range(n))
+
+
+@bench('iterators', 'nth',
+       baseline=('itertools.islice', lambda n: lambda: next(
+           islice(range(n), n - 1, None))))
+def _(n):
+    return lambda: iterators.nth(range(n), n - 1)
+
+
+@bench('iterators', 'partition')
+def _(n):
+    def run():
+        a, b = iterators.partition(range(n), lambda x: x & 1)
+        exhaust(a)
+        exhaust(b)
+    return run
+
+
+@bench('iterators', 'pick')
+def _(n):
+    return lambda: exhaust(islice(iterators.pick(range(n // 2)), n))
+
+
+@bench('iterators', 'powerset', sizes=(4, 10, 16),
+       baseline=('itertools.combinations', lambda n: lambda: exhaust(
+           chain.from_iterable(combinations(range(n), r)
+                               for r in range(n + 1)))))
+def _(n):
+    return lambda: exhaust(iterators.powerset(range(n)))
+
+
+@bench('iterators', 'combinations', sizes=(10, 20, 40))
+def _(n):
+    c = iterators.combinations(range(n), n // 2)
+    middle = c.size // 2
+    return lambda: c.rank(c[middle])
+
+
+@bench('iterators', 'permutations', sizes=(10, 20, 40))
+def _(n):
+    p = iterators.permutations(range(n))
+    middle = p.size // 2
+    return lambda: p.rank(p[middle])
+
+
+@bench('iterators', 'product', sizes=(10, 20, 40))
+def _(n):
+    p = iterators.product(range(10), repeat=n)
+    return lambda: exhaust(p.iterfrom(p.size // 2, p.size // 2 + 1000))
+
+
+@bench('iterators', 'prefetch',
+       baseline=('plain iteration', lambda n: lambda: exhaust(range(n))))
+def _(n):
+    return lambda: exhaust(iterators.prefetch(range(n), 64))
+
+
+@bench('iterators', 'reservoir', sizes=(1000, 100000),
+       baseline=('random.sample(list())', lambda n: partial(
+           lambda: __import__('random').sample(list(range(n)), 10))))
+def _(n):
+    return lambda: iterators.reservoir(10).extend(range(n))
+
+
+@bench('iterators', 'reservoir_sample',
+       baseline=('random.sample(list())', lambda n: partial(
+           lambda: __import__('random').sample(list(range(n)), 10))))
+def _(n):
+    return partial(iterators.reservoir_sample, range(n), 10)
+
+
+@bench('iterators', 'weighted_reservoir_sample',
+       baseline=('random.choices(list())', lambda n: partial(
+           lambda: __import__('random').choices(list(range(1, n + 1)),
+                                                list(range(1, n + 1)), k=10))))
+def _(n):
+    return partial(iterators.weighted_reservoir_sample, range(1, n + 1), 10,
+                   float)
+
+
+@bench('iterators', 'split', sizes=SCALAR)
+def _(n):
+    data = [1] * n
+    return lambda: iterators.split(data)
+
+
+def _two_passes(first, second):
+    exhaust(first)
+    exhaust(second)
+
+
+@bench('iterators', 'replayable',
+       baseline=('itertools.tee', lambda n: lambda: _two_passes(
+           *tee(range(n)))))
+def _(n):
+    def run():
+        buffer = iterators.replayable(range(n), memory_limit=10000)
+        _two_passes(buffer.cursor(), buffer.cursor())
+    return run
+
+
+@bench('iterators', 'take',
+       baseline=('itertools.islice', lambda n: lambda: exhaust(
+           islice(range(n), n))))
+def _(n):
+    return lambda: exhaust(iterators.take(n, range(n)))
+
+
+@bench('iterators', 'topk',
+       baseline=('heapq.nlargest', lambda n: partial(
+           __import__('heapq').nlargest, 10, _shuffled(n))))
+def _(n):
+    return partial(iterators.topk, _shuffled(n), 10)
+
+
+@bench('iterators', 'external_sort', sizes=(10, 1000, 100000),
+       baseline=('sorted', lambda n: partial(
+           sorted, list(range(n, 0, -1)))))
+def _(n):
+    data = list(range(n, 0, -1))
+    return lambda: exhaust(iterators.external_sort(data,
+                                                   memory_limit=10000))
+
+
+@bench('iterators', 'unique',
+       baseline=('set()', lambda n: partial(set, [i % 100 for i in range(n)])))
+def _(n):
+    data = [i % 100 for i in range(n)]
+    return lambda: exhaust(iterators.unique(data))
+
+
+@bench('iterators', 'where')
+def _(n):
+    dicts = [{'a': i % 3, 'b': i} for i in range(n)]
+    return lambda: exhaust(iterators.where(dicts, a=1))
+
+
+@bench('iterators', 'with_iter')
+def _(n):
+    data = list(range(n))
+
+    class Context(object):
+        def __enter__(self):
+            return data
+
+        def __exit__(self, *exc_info):
+            return False
+
+    return lambda: exhaust(iterators.with_iter(Context()))
+
+
+#
+#   dhaffner.functions
+#
+
+
+def _add(x, y):
+    return x + y
+
+
+def _inc(x):
+    return x + 1
+
+
+# The closures compose, curry, flip, juxt, lift and constant returned before
+# they became picklable, kept as baselines for the objects that replaced them.
+
+def _closure_compose(*funcs):
+    return functools.reduce(lambda f, g: lambda x: f(g(x)), funcs)
+
+
+def _closure_constant(x):
+    return lambda *args, **kwargs: x
+
+
+def _closure_curry(func, n):
+    def curried(*args, **kwargs):
+        if len(args) >= n:
+            return func(*args, **kwargs)
+        return _closure_curry(partial(func, *args, **kwargs), n - len(args))
+    return curried
+
+
+def _closure_flip(func):
+    @functools.wraps(func)
+    def flipped(*args, **kwargs):
+        return func(*reversed(args), **kwargs)
+    return flipped
+
+
+def _closure_juxt(*funcs):
+    def inner(*args, **kwargs):
+        return (f(*args, **kwargs) for f in funcs)
+    return inner
+
+
+def _closure_lift(func):
+    @functools.wraps(func)
+    def lifted(args):
+        return func(*args)
+    return lifted
+
+
+def _twice(curried, n):
+    return lambda: curried(n)(n)
+
+
+def _exhausted(func, n):
+    return lambda: exhaust(func(n))
+
+
+@bench('functions', 'affine', sizes=(10, 1000, 100000),
+       baseline=('composable ** n', lambda n: partial(
+           functions.composable(_inc) ** n, 0)))
+def _(n):
+    return partial(functions.affine(1, 1) ** n, 0)
+
+
+@bench('functions', 'atomize', sizes=SCALAR)
+def _(n):
+    return functions.atomize(partial(abs, n))
+
+
+def _bulk(keys):
+    return [key * 2 for key in keys]
+
+
+async def _abulk(keys):
+    return _bulk(keys)
+
+
+@bench('functions', 'batched', sizes=SCALAR,
+       baseline=('direct bulk call', lambda n: partial(_bulk, [n])))
+def _(n):
+    return partial(functions.batched(_bulk, max_size=1), n)
+
+
+def _loop_runner(coroutine_func, *args):
+    loop = __import__('asyncio').new_event_loop()
+    return lambda: loop.run_until_complete(coroutine_func(*args))
+
+
+async def _gather(func, args):
+    return await __import__('asyncio').gather(*map(func, args))
+
+
+@bench('functions', 'async_batched', sizes=(10, 1000),
+       baseline=('one awaited bulk call', lambda n: _loop_runner(
+           _abulk, list(range(n)))))
+def _(n):
+    get = functions.async_batched(_abulk, max_size=n)
+    return _loop_runner(_gather, get, list(range(n)))
+
+
+@bench('functions', 'caller', sizes=SCALAR)
+def _(n):
+    return partial(functions.caller((n,)), abs)
+
+
+@bench('functions', 'composable', sizes=SCALAR)
+def _(n):
+    f = functions.composable(_inc)
+    return partial(f ** 3, n)
+
+
+@bench('functions', 'compose', sizes=SCALAR,
+       baseline=('closure', lambda n: partial(
+           _closure_compose(_inc, _inc, _inc), n)))
+def _(n):
+    return partial(functions.compose(_inc, _inc, _inc), n)
+
+
+@bench('functions', 'constant', sizes=SCALAR,
+       baseline=('closure', lambda n: _closure_constant(n)))
+def _(n):
+    return functions.constant(n)
+
+
+@bench('functions', 'context', sizes=SCALAR)
+def _(n):
+    def run():
+        with functions.context(abs, n) as value:
+            return value
+    return run
+
+
+@bench('functions', 'curry', sizes=SCALAR,
+       baseline=('closure', lambda n: _twice(_closure_curry(_add, 2), n)))
+def _(n):
+    return _twice(functions.curry(_add), n)
+
+
+@bench('functions', 'flip', sizes=SCALAR,
+       baseline=('closure', lambda n: partial(
+           _closure_flip(operator.sub), n, 1)))
+def _(n):
+    return partial(functions.flip(operator.sub), n, 1)
+
+
+@bench('functions', 'identity', sizes=SCALAR)
+def _(n):
+    return partial(functions.identity, n)
+
+
+@bench('functions', 'juxt', sizes=SCALAR,
+       baseline=('closure', lambda n: _exhausted(
+           _closure_juxt(_inc, abs, _inc), n)))
+def _(n):
+    return _exhausted(functions.juxt(_inc, abs, _inc), n)
+
+
+@bench('functions', 'lift', sizes=SCALAR,
+       baseline=('closure', lambda n: partial(_closure_lift(_add), (n, n))))
+def _(n):
+    return partial(functions.lift(_add), (n, n))
+
+
+@bench('functions', 'nargs', sizes=SCALAR)
+def _(n):
+    return partial(functions.nargs, _add)
+
+
+@bench('functions', 'pipe', sizes=SCALAR)
+def _(n):
+    return partial(functions.pipe(abs, _inc), n)
+
+
+def _with(ctx):
+    with ctx as value:
+        return value
+
+
+@bench('functions', 'pooled_context',
+       baseline=('context', lambda n: partial(
+           _with, functions.context(bytearray, n))))
+def _(n):
+    return partial(_with, functions.pooled_context(bytearray, n))
+
+
+@bench('functions', 'scan',
+       baseline=('itertools.accumulate', lambda n: lambda: exhaust(
+           accumulate(range(n), operator.add))))
+def _(n):
+    return lambda: exhaust(functions.scan(operator.add, range(n), 0))
+
+
+@bench('functions', 'checkpointed_scan',
+       baseline=('itertools.accumulate', lambda n: lambda: exhaust(
+           accumulate(range(n), operator.add))))
+def _(n):
+    return lambda: exhaust(functions.checkpointed_scan(operator.add, range(n)))
+
+
+@bench('functions', 'parallel_scan',
+       baseline=('itertools.accumulate', lambda n: partial(
+           lambda data: list(accumulate(data)), list(range(n)))))
+def _(n):
+    data = list(range(n))
+    return partial(functions.parallel_scan, operator.add, data)
+
+
+@bench('functions', 'vectorize', sizes=SCALAR)
+def _(n):
+    return partial(functions.vectorize(abs), n)
+
+
+#
+#   dhaffner.builtins
+#
+
+
+@bench('builtins', 'dictfilter',
+       baseline=('dict comprehension', lambda n: partial(
+           lambda d: {k: v for k, v in d.items() if v & 1},
+           dict.fromkeys(range(n), 1))))
+def _(n):
+    d = dict.fromkeys(range(n), 1)
+    return partial(builtins.dictfilter, lambda k, v: v & 1, d)
+
+
+@bench('builtins', 'dictmap',
+       baseline=('dict comprehension', lambda n: partial(
+           lambda d: {k: v + 1 for k, v in d.items()},
+           dict.fromkeys(range(n), 1))))
+def _(n):
+    d = dict.fromkeys(range(n), 1)
+    return partial(builtins.dictmap, lambda k, v: (k, v + 1), d)
+
+
+@bench('builtins', 'dictitemgetter', sizes=SCALAR)
+def _(n):
+    get = builtins.dictitemgetter('a', 'b')
+    return partial(get, {'a': n, 'b': n, 'c': n})
+
+
+@bench('builtins', 'dictattrgetter', sizes=SCALAR)
+def _(n):
+    get = builtins.dictattrgetter('real', 'imag')
+    return partial(get, complex(n, n))
+
+
+@bench('builtins', 'lazyproperty', sizes=SCALAR)
+def _(n):
+    class Lazy(object):
+        @builtins.lazyproperty
+        def value(self):
+            return n
+
+    obj = Lazy()
+    return lambda: obj.value
+
+
+#
+#   dhaffner.common
+#
+
+
+@bench('common', 'compose', sizes=SCALAR,
+       baseline=('nested calls', lambda n: lambda: _inc(_inc(_inc(n)))))
+def _(n):
+    return partial(common.compose(_inc, _inc, _inc), n)
+
+
+@bench('common', 'sifter',
+       baseline=('all()', lambda n: lambda: exhaust(
+           x for x in range(n) if all(f(x) for f in (bool, abs)))))
+def _(n):
+    return lambda: exhaust(filter(common.sifter(bool, abs), range(n)))
+
+
+#
+#   dhaffner.misc
+#
+
+
+@bench('misc', 'files', sizes=SCALAR)
+def _(n):
+    directory = dhaffner.__path__[0]
+    return lambda: exhaust(misc.files(directory, '*'))
+
+
+@bench('misc', 'find',
+       baseline=('re.search', lambda n: partial(
+           re.search, r'(\d+)', 'x' * n + '1234')))
+def _(n):
+    return partial(misc.find, r'(\d+)', 'x' * n + '1234')
+
+
+@bench('misc', 'lazysplit',
+       baseline=('str.splitlines', lambda n: partial(
+           str.splitlines, 'line\n' * n)))
+def _(n):
+    text = 'line\n' * n
+    return lambda: exhaust(misc.lazysplit(text))
+
+
+@bench('misc', 'noop', sizes=SCALAR)
+def _(n):
+    return partial(misc.noop, n)
+
+
+#
+#   Runner
+#
+
+
+def timed(func, repeat=5, target=0.2):
+    """Return the best per-call time of func, in seconds."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat, number)) / number
+
+
+def allocated(func):
+    """Return the peak number of bytes allocated during one call of func."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case, n, repeat):
+    func = case.setup(n)
+    per_call = timed(func, repeat)
+    result = {
+        'module': case.module,
+        'name': case.name,
+        'size': n,
+        'per_call_s': per_call,
+        'throughput': n / per_call,
+        'peak_bytes': allocated(func),
+    }
+    if case.baseline is not None:
+        label, setup = case.baseline
+        baseline = timed(setup(n), repeat)
+        result['baseline'] = {
+            'name': label,
+            'per_call_s': baseline,
+            'ratio': per_call / baseline,
+        }
+    return result
+
+
+def missing():
+    """Return the public helpers (per __all__) that have no benchmark."""
+    covered = set((case.module, case.name) for case in CASES)
+    return sorted(
+        (module, name)
+        for module in MODULES
+        for name in getattr(dhaffner, module).__all__
+        if (module, name) not in covered
+    )
+
+
+def compare(results, previous):
+    key = operator.itemgetter('module', 'name', 'size')
+    before = dict((key(r), r) for r in previous['results'])
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        print('{:<10} {:<16} {:>7}  {:>9.3g}s -> {:>9.3g}s  x{:.2f}'.format(
+            result['module'], result['name'], result['size'],
+            old['per_call_s'], result['per_call_s'],
+            result['per_call_s'] / old['per_call_s']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='pattern', default='',
+                        help='only run cases whose module.name matches')
+    parser.add_argument('--max-size', type=int, default=max(SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    parser.add_argument('--check', action='store_true',
+                        help='list public helpers with no benchmark')
+    parser.add_argument('--max-ratio', type=float,
+                        help='fail if a case is this many times slower than '
+                             'its baseline')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        gaps = missing()
+        for module, name in gaps:
+            print('{}.{}'.format(module, name))
+        return 1 if gaps else 0
+
+    results = []
+    for case in CASES:
+        if not re.search(args.pattern, '{}.{}'.format(case.module, case.name)):
+            continue
+        for n in case.sizes:
+            if n > args.max_size:
+                continue
+            result = run_case(case, n, args.repeat)
+            results.append(result)
+            print('{module:<10} {name:<16} {size:>7}  {per_call_s:>9.3g}s'
+                  '  {peak_bytes:>9}B'.format(**result), file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.max_ratio is not None:
+        slow = [r for r in results
+                if r.get('baseline', {}).get('ratio', 0) > args.max_ratio]
+        for r in slow:
+            print('SLOWER {}.{} ({}): x{:.2f} vs {}'.format(
+                r['module'], r['name'], r['size'], r['baseline']['ratio'],
+                r['baseline']['name']), file=sys.stderr)
+        return 1 if slow else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
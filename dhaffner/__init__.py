@@ -0,0 +1,24 @@
+'''
+Some Python utility modules.
+
+Submodules are imported lazily on first attribute access (PEP 562), so that
+``import dhaffner`` does not pay for modules it never uses.
+'''
+
+__all__ = (
+    'builtins', 'common', 'functions', 'iterators', 'misc', 'profiling'
+)
+
+
+def __getattr__(name):
+    if name in __all__:
+        # Importing a submodule binds it as an attribute of this package.
+        __import__(__name__ + '.' + name)
+        return globals()[name]
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
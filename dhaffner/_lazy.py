@@ -0,0 +1,26 @@
+'''Load a module's larger, less used names from its submodules on demand.'''
+
+
+def lazy(namespace, submodules):
+    """Return PEP 562 ``__getattr__`` and ``__dir__`` functions for the module
+    whose globals are namespace. Each name in submodules, a dict mapping it
+    to the submodule defining it, is imported on first access and cached in
+    namespace, so importing the module itself does not pay for it.
+    """
+    package = namespace['__name__']
+
+    def __getattr__(name):
+        if name in submodules:
+            module = __import__(package + '.' + submodules[name],
+                                fromlist=(name,))
+            value = namespace[name] = getattr(module, name)
+            return value
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(package, name)
+        )
+
+    def __dir__():
+        return sorted(set(namespace) | set(namespace.get('__all__', ())) |
+                      set(submodules))
+
+    return __getattr__, __dir__
@@ -6,12 +6,11 @@ mappings, files, classes, instances and exceptions."
 __all__ = ('dictfilter', 'dictitemgetter', 'dictmap')
 
 
+from itertools import starmap
 from operator import attrgetter, itemgetter
 
 from six import iteritems
-from six.moves import map, filter, zip
-
-from dhaffner.functions import lift
+from six.moves import zip
 
 
 #
@@ -20,11 +19,11 @@ from dhaffner.functions import lift
 
 
 def dictmap(func, d):
-    return dict(map(lift(func), iteritems(d)))
+    return dict(starmap(func, iteritems(d)))
 
 
 def dictfilter(func, d):
-    return dict(filter(lift(func), iteritems(d)))
+    return dict(item for item in iteritems(d) if func(*item))
 
 
 def dictgetter(getterfunc):  # Not included in __all__
@@ -1,10 +1,58 @@
 __all__ = ('compose', 'sifter')
 
-from six.moves import reduce
+from functools import partial
+from types import MethodType
+
+from dhaffner import profiling
+
+
+class _partial(partial):  # noqa
+    """A :func:`functools.partial` that binds like a function when looked up
+    on an instance, so the combinators built from it work as methods.
+
+    Unlike a closure it pickles, at a cost: calls go through partial's
+    generic call path (subclasses only keep vectorcall from Python 3.12)
+    plus a module level helper, which makes small combinators such as
+    constant, lift or a two stage compose up to about 1.5x slower to call
+    than the closures they replaced. benchmarks/suite.py measures each
+    against its closure.
+    """
+
+    __slots__ = ()
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return MethodType(self, obj)
+
+
+def _compose2(f, g, x):
+    return f(g(x))
+
+
+def _compose(stages, x):
+    for f in stages:
+        x = f(x)
+    return x
 
 
 def compose(*funcs):
-    return reduce(lambda f, g: lambda x: f(g(x)), funcs)
+    """Return the composition of funcs, applied right to left.
+
+    The result is a :func:`functools.partial` of a module level function, so
+    it pickles (e.g. to a process pool) whenever funcs do; see
+    :class:`_partial` for what that costs per call. Stages instrumented while
+    profiling is enabled do not pickle.
+    """
+    if not funcs:
+        raise TypeError('compose() takes at least one function')
+    if profiling.enabled():
+        funcs = [profiling.instrument(f) for f in funcs]
+    if len(funcs) == 1:
+        return funcs[0]
+    if len(funcs) == 2:
+        return _partial(_compose2, *funcs)
+    return _partial(_compose, tuple(funcs[::-1]))
 
 
 def sifter(*funcs):
@@ -2,8 +2,12 @@
 ''':class:`functions` Some high-order functions and decorators.'''
 
 __all__ = (
+    'affine',
+    'async_batched',
     'atomize',
+    'batched',
     'caller',
+    'checkpointed_scan',
     'composable',
     'compose',
     'constant',
@@ -14,24 +18,37 @@ __all__ = (
     'juxt',
     'lift',
     'nargs',
+    'parallel_scan',
     'pipe',
+    'pooled_context',
     'scan',
     'vectorize'
 )
 
 
 import operator
+import sys
 
-from contextlib import contextmanager
-from functools import partial, wraps
-from inspect import getargspec, getouterframes, currentframe
-from random import random
-from threading import RLock
+from collections import namedtuple
+from functools import partial, update_wrapper, wraps
+from itertools import accumulate, chain, repeat
 
 from six.moves import map, reduce
 
-from dhaffner.iterators import compact, first, last, isiterable, iterate, take
-from dhaffner.common import compose
+from dhaffner import profiling
+from dhaffner._lazy import lazy
+from dhaffner.iterators import compact, consume, isiterable, iterate_n
+from dhaffner.common import _partial, compose
+
+
+# Batching and pooling are loaded from submodules on first use.
+__getattr__, __dir__ = lazy(globals(), {
+    'async_batched': 'batching',
+    'batched': 'batching',
+    'BatchStats': 'batching',
+    'pooled_context': 'pooling',
+    'PoolStats': 'pooling'
+})
 
 
 def atomize(func, lock=None):
@@ -42,6 +59,7 @@ def atomize(func, lock=None):
     :argument lock: the lock to use (optional)
     """
     if lock is None:
+        from threading import RLock
         lock = RLock()
 
     @wraps(func)
@@ -59,13 +77,13 @@ def caller(args, kwargs=None):
     return lambda func: func(*args, **(kwargs or {}))
 
 
+def _flipped(func, /, *args, **kwargs):
+    return func(*args[::-1], **kwargs)
+
+
 def flip(func):
     """Decorate the given function to reverse the order of its arguments."""
-    @wraps(func)
-    def flipped(*args, **kwargs):
-        return func(*reversed(args), **kwargs)
-
-    return flipped
+    return update_wrapper(_partial(_flipped, func), func)
 
 
 class composable(object):  # noqa
@@ -73,7 +91,9 @@ class composable(object):  # noqa
         self.func = func
 
     def __getattr__(self, attr):
-        frame, *_ = getouterframes(currentframe())[1]
+        if attr[:2] == '__':  # protocol lookups, e.g. by pickle or profiling
+            raise AttributeError(attr)
+        frame = sys._getframe(1)
         for dct in [frame.f_globals, __builtins__]:
             if attr in dct:
                 break
@@ -136,9 +156,7 @@ class composable(object):  # noqa
 
     # iterate
     def __pow__(self, n):
-        return composable.compose(
-            last, partial(take, n), partial(iterate, self.func)
-        )
+        return composable(partial(iterate_n, self.func, n=n))
 
     def __neg__(self, neg=operator.neg):
         return composable.compose(neg, self.func)
@@ -166,6 +184,10 @@ class composable(object):  # noqa
     def __repr__(self):
         return repr(self.func)
 
+    # __getattr__ would otherwise answer pickle's __setstate__ lookup
+    def __reduce__(self):
+        return self.__class__, (self.func,)
+
     #
 
     @classmethod
@@ -177,25 +199,75 @@ class composable(object):  # noqa
         return cls(compose(lift(func), juxt(*funcs)))
 
 
+def _affine(a, b, x):
+    return a * x + b
+
+
+class affine(composable):  # noqa
+    """A composable affine map ``x -> a * x + b`` over numbers.
+
+    Composing two affine maps with ``<<`` or ``>>`` yields another affine
+    map, and ``f ** n`` is computed by repeated squaring of the
+    coefficients, so it costs O(log n) multiplications instead of n calls.
+    """
+    def __init__(self, a, b=0):
+        self.a, self.b = a, b
+        super(affine, self).__init__(partial(_affine, a, b))
+
+    def __pow__(self, n):
+        result, square = affine(1, 0), self
+        while n > 0:
+            if n & 1:
+                result = result << square
+            square = square << square
+            n >>= 1
+        return result
+
+    def __lshift__(self, other):
+        if isinstance(other, affine):
+            return affine(self.a * other.a, self.a * other.b + self.b)
+        return super(affine, self).__lshift__(other)
+
+    def __rshift__(self, other):
+        if isinstance(other, affine):
+            return other << self
+        return super(affine, self).__rshift__(other)
+
+    def __repr__(self):
+        return 'affine({!r}, {!r})'.format(self.a, self.b)
+
+    def __reduce__(self):
+        return self.__class__, (self.a, self.b)
+
+    __str__ = __repr__
+
+
+def _constant(x, /, *args, **kwargs):
+    return x
+
+
 def constant(x):
-    """Close x under an anonymous function."""
-    return lambda *args, **kwargs: x
+    """Return a function of any arguments that always returns x."""
+    return _partial(_constant, x)
 
 
-@contextmanager
-def context(func, *args, **kwargs):
+class context(object):  # noqa
     """Return a context for lazily evaluating a function with given input."""
-    yield func(*args, **kwargs)
+    def __init__(self, func, *args, **kwargs):
+        self.func, self.args, self.kwargs = func, args, kwargs
 
+    def __enter__(self):
+        return self.func(*self.args, **self.kwargs)
 
-# Return the number of position arguments in the given function.
-nargs = compose(
-    partial(reduce, operator.sub),
-    partial(map, len),
-    compact,
-    operator.attrgetter('args', 'defaults'),
-    getargspec
-)
+    def __exit__(self, *exc_info):
+        return False
+
+
+def nargs(func):
+    """Return the number of position arguments in the given function."""
+    from inspect import getfullargspec  # deferred: inspect is slow
+    spec = getfullargspec(func)
+    return reduce(operator.sub, map(len, compact((spec.args, spec.defaults))))
 
 
 def curry(func, n=None):
@@ -205,14 +277,13 @@ def curry(func, n=None):
 
     if n is None:
         n = nargs(func)
+    return _partial(_curried, func, n)
 
-    # @wraps(func)
-    def curried(*args, **kwargs):
-        if len(args) >= n:
-            return func(*args, **kwargs)
-        return curry(partial(func, *args, **kwargs), n - len(args))
 
-    return curried
+def _curried(func, n, /, *args, **kwargs):
+    if len(args) >= n:
+        return func(*args, **kwargs)
+    return _partial(_curried, partial(func, *args, **kwargs), n - len(args))
 
 
 def identity(x):
@@ -227,21 +298,24 @@ def juxt(*funcs):
 
     return lambda *a, **k: func(f1(*a, **k), f2(*a, **k), ...)
     """
-    def inner(*args, **kwargs):
-        return (f(*args, **kwargs) for f in funcs)
+    if profiling.enabled():
+        funcs = [profiling.instrument(f) for f in funcs]
+    return _partial(_juxt, tuple(funcs))
+
 
-    return inner
+def _juxt(funcs, /, *args, **kwargs):
+    return (f(*args, **kwargs) for f in funcs)
+
+
+def _lifted(func, args):
+    return func(*args)
 
 
 def lift(func):
     """Decorate a function to accept a list of args instead of position arguments.
     Like a curried apply.
     """
-    @wraps(func)
-    def lifted(args):
-        return func(*args)
-
-    return lifted
+    return update_wrapper(_partial(_lifted, func), func)
 
 
 def pipe(*funcs):
@@ -249,6 +323,9 @@ def pipe(*funcs):
     input. Useful for wrapping functions which do not return a useful input,
     such as print.
     """
+    if profiling.enabled():
+        funcs = [profiling.instrument(f) for f in funcs]
+
     def wrapped(x):
         for f in funcs:
             f(x)
@@ -257,16 +334,153 @@ def pipe(*funcs):
     return wrapped
 
 
+# Binary functions with an equivalent NumPy ufunc, for scanning arrays.
+_ufuncs = {
+    operator.add: 'add',
+    operator.mul: 'multiply',
+    operator.and_: 'bitwise_and',
+    operator.or_: 'bitwise_or',
+    operator.xor: 'bitwise_xor',
+    max: 'maximum',
+    min: 'minimum'
+}
+
+
+def _ufunc(func, sequence):
+    """Return the NumPy ufunc equivalent to func if sequence is a 1-d NumPy
+    array, otherwise None. NumPy is never imported here.
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is None or not isinstance(sequence, numpy.ndarray):
+        return None
+    name = _ufuncs.get(func)
+    if name is None or sequence.ndim != 1:
+        return None
+    return getattr(numpy, name)
+
+
 def scan(func, sequence, init=None):
+    """Yield the running aggregates of sequence under the binary func, like
+    :func:`itertools.accumulate`. If init is given, it is yielded first and
+    seeds the aggregate.
+
+    >>> list(scan(operator.add, [1, 2, 3]))
+    [1, 3, 6]
+    """
     if init is None:
-        curr = first(sequence)
+        ufunc = _ufunc(func, sequence)
+        if ufunc is not None:
+            return iter(ufunc.accumulate(sequence))
     else:
-        curr = init
-        yield init
+        sequence = chain((init,), sequence)
+
+    if func is operator.add:
+        return accumulate(sequence)  # avoids calling func for every element
+    return accumulate(sequence, func)
+
+
+Checkpoint = namedtuple('Checkpoint', 'consumed value')
+
+
+class checkpointed_scan(object):  # noqa
+    """Like :func:`scan`, but keeps track of its position so that a long
+    running scan can be stopped and later resumed.
+
+    :meth:`checkpoint` returns a :class:`Checkpoint` of the number of input
+    elements consumed and the running aggregate. Passing it back in as
+    checkpoint resumes the scan; if skip is true the sequence is assumed to
+    start from the beginning again and the consumed elements are dropped.
+    """
+    _empty = object()
+
+    def __init__(self, func, sequence, init=None, checkpoint=None,
+                 skip=True):
+        self.func = func
+        self.iterator = iter(sequence)
+        self.pending = False
+        if checkpoint is not None:
+            self.consumed, self.value = checkpoint
+            if skip:
+                consume(self.iterator, self.consumed)
+            if self.consumed == 0 and self.value is None:
+                self.value = self._empty
+        elif init is not None:
+            self.consumed, self.value, self.pending = 0, init, True
+        else:
+            self.consumed, self.value = 0, self._empty
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            self.pending = False
+            return self.value
+        element = next(self.iterator)
+        if self.value is self._empty:
+            self.value = element
+        else:
+            self.value = self.func(self.value, element)
+        self.consumed += 1
+        return self.value
+
+    next = __next__
+
+    def checkpoint(self):
+        value = None if self.value is self._empty else self.value
+        return Checkpoint(self.consumed, value)
+
+
+def _scan_chunk(func, chunk):
+    ufunc = _ufunc(func, chunk)
+    if ufunc is not None:
+        return ufunc.accumulate(chunk)
+    return list(scan(func, chunk))
+
+
+def _offset_chunk(func, offset, chunk):
+    ufunc = _ufunc(func, chunk)
+    if ufunc is not None:
+        return ufunc(offset, chunk)
+    return [func(offset, x) for x in chunk]
+
+
+def parallel_scan(func, sequence, chunksize=None, workers=4, executor=None):
+    """Compute ``list(scan(func, sequence))`` for an associative func over a
+    sliceable sequence (e.g. a list or a 1-d NumPy array), using a blocked
+    parallel prefix scan: each chunk is scanned independently, the chunk
+    totals are combined, then each chunk is offset by the total before it.
+
+    By default chunks are processed by a thread pool, which only helps when
+    func releases the GIL, as NumPy ufuncs do. For pure Python functions
+    pass a :class:`concurrent.futures.ProcessPoolExecutor`; func must then be
+    picklable. A NumPy array input returns an array.
+    """
+    n = len(sequence)
+    if chunksize is None:
+        chunksize = max(1, -(-n // workers))
+    if n <= chunksize:
+        return _scan_chunk(func, sequence)
+
+    chunks = [sequence[i:i + chunksize] for i in range(0, n, chunksize)]
+
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(workers) as pool:
+            return parallel_scan(func, sequence, chunksize, workers, pool)
+
+    scanned = list(executor.map(_scan_chunk, repeat(func), chunks))
+
+    offsets = [scanned[0][-1]]
+    for chunk in scanned[1:-1]:
+        offsets.append(func(offsets[-1], chunk[-1]))
+
+    rest = executor.map(_offset_chunk, repeat(func), offsets, scanned[1:])
+    results = [scanned[0]] + list(rest)
 
-    for element in sequence:
-        curr = func(curr, element)
-        yield curr
+    if _ufunc(func, sequence) is not None:
+        return sys.modules['numpy'].concatenate(results)
+    return list(chain.from_iterable(results))
 
 
 def vectorize(func):
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+'''Coalescing many single calls into fewer bulk calls.'''
+
+__all__ = (
+    'async_batched',
+    'batched'
+)
+
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from functools import update_wrapper
+from time import perf_counter
+
+
+BatchStats = namedtuple('BatchStats', 'calls batches sizes waits')
+
+
+class _Batch(object):
+    """Arguments gathered for one bulk call, and its outcome."""
+    __slots__ = ('args', 'start', 'results', 'error', 'done', 'loop', 'timer',
+                 'task')
+
+    def __init__(self, done):
+        self.args, self.start, self.done = [], perf_counter(), done
+        self.results = self.error = self.loop = self.timer = self.task = None
+
+    def resolve(self, results):
+        results = list(results)
+        if len(results) != len(self.args):
+            raise ValueError('bulk function returned {} results for {} '
+                             'arguments'.format(len(results), len(self.args)))
+        self.results = results
+
+    def result(self, index):
+        if self.error is not None:
+            raise self.error
+        result = self.results[index]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+class _batcher(object):
+    """Shared bookkeeping of :class:`batched` and :class:`async_batched`."""
+
+    # Upper bounds, in seconds, of the wait time histogram buckets.
+    wait_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+                    float('inf'))
+
+    def __init__(self, bulk_func, max_size=64, max_wait=0.005):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        update_wrapper(self, bulk_func)
+        self.bulk_func, self.max_size, self.max_wait = \
+            bulk_func, max_size, max_wait
+        self.pending = None
+        self.calls = self.batches = 0
+        self.sizes, self.waits = Counter(), Counter()
+
+    def _close(self, batch):
+        """Stop batch from taking new calls and record its size and wait."""
+        if self.pending is batch:
+            self.pending = None
+        wait = perf_counter() - batch.start
+        self.batches += 1
+        self.sizes[len(batch.args)] += 1
+        self.waits[self.wait_buckets[bisect_left(self.wait_buckets,
+                                                 wait)]] += 1
+
+    def stats(self):
+        """Return the number of calls and batches so far, and histograms of
+        batch sizes and of how long batches waited to fill, as dicts from
+        size, or bucket upper bound in seconds, to count.
+        """
+        return BatchStats(self.calls, self.batches, dict(self.sizes),
+                          dict(sorted(self.waits.items())))
+
+
+class batched(_batcher):  # noqa
+    """Coalesce concurrent single argument calls from many threads into one
+    ``bulk_func(list_of_args)`` call, which must return a sequence of
+    results in the same order. Each caller gets its own result, or has it
+    raised if it is an exception; if bulk_func raises, every caller in the
+    batch does.
+
+    The first caller into an empty batch waits up to max_wait seconds for
+    it to fill to max_size, then makes the bulk call in its own thread::
+
+        get = batched(store.get_many, max_size=100, max_wait=0.002)
+        value = get(key)
+    """
+    def __init__(self, bulk_func, max_size=64, max_wait=0.005):
+        from threading import Condition, Event  # deferred
+        super(batched, self).__init__(bulk_func, max_size, max_wait)
+        self.lock, self.event = Condition(), Event
+
+    def __call__(self, arg):
+        with self.lock:
+            self.calls += 1
+            batch = self.pending
+            leader = batch is None
+            if leader:
+                batch = self.pending = _Batch(self.event())
+            index = len(batch.args)
+            batch.args.append(arg)
+            if len(batch.args) >= self.max_size:
+                self._close(batch)
+                self.lock.notify_all()
+            elif leader:
+                self.lock.wait_for(lambda: self.pending is not batch,
+                                   self.max_wait)
+                if self.pending is batch:
+                    self._close(batch)
+
+        if leader:
+            try:
+                batch.resolve(self.bulk_func(batch.args))
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+        return batch.result(index)
+
+
+class async_batched(_batcher):  # noqa
+    """Like :class:`batched`, for coroutines: bulk_func is awaited, and so
+    is each call. The bulk call runs in a task of its own, so cancelling one
+    caller does not affect the rest of its batch. Calls are only batched
+    with others on the same event loop.
+    """
+    async def __call__(self, arg):
+        import asyncio  # deferred: asyncio is slow to import
+
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        batch = self.pending
+        if batch is not None and batch.loop is not loop:
+            # Left by another event loop, which still flushes it if running.
+            batch = self.pending = None
+        if batch is None:
+            batch = self.pending = _Batch(asyncio.Event())
+            batch.loop = loop
+            batch.timer = loop.call_later(self.max_wait, self._dispatch,
+                                          batch)
+        index = len(batch.args)
+        batch.args.append(arg)
+        if len(batch.args) >= self.max_size:
+            batch.timer.cancel()
+            self._dispatch(batch)
+        await batch.done.wait()
+        return batch.result(index)
+
+    def _dispatch(self, batch):
+        from asyncio import ensure_future
+        self._close(batch)
+        batch.task = ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            batch.resolve(await self.bulk_func(batch.args))
+        except BaseException as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''Reusing expensive instances across ``with`` blocks.'''
+
+__all__ = (
+    'pooled_context',
+)
+
+from collections import deque, namedtuple
+from time import perf_counter
+
+from dhaffner.functions import context
+
+
+PoolStats = namedtuple('PoolStats', 'size in_use idle peak created reused '
+                                    'discarded waits exhausted utilization')
+
+
+def _wake_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class pooled_context(context):  # noqa
+    """A :class:`context` that keeps the instances func(*args, **kwargs)
+    returns and reuses them across ``with`` blocks.
+
+    Up to maxsize instances are created, as needed. When all of them are in
+    use, entering blocks until one is released, for at most timeout seconds
+    if given, then raises RuntimeError; with block=False it raises right
+    away. Idle instances older than idle_timeout seconds, and those for
+    which validate(instance) is false when taken from the pool, are
+    discarded and passed to dispose, if given.
+
+    ``with`` may be used from many threads at once and ``async with`` from
+    many tasks, which wait without blocking the event loop; each thread or
+    task gets back the instance it entered with.
+    """
+    _create = object()
+
+    def __init__(self, func, *args, maxsize=8, idle_timeout=None,
+                 validate=None, dispose=None, block=True, timeout=None,
+                 **kwargs):
+        from contextvars import ContextVar
+        from threading import Condition, Lock  # deferred
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        super(pooled_context, self).__init__(func, *args, **kwargs)
+        self.maxsize, self.idle_timeout = maxsize, idle_timeout
+        self.validate, self.dispose = validate, dispose
+        self.block, self.timeout = block, timeout
+        self.lock = Lock()
+        self.available = Condition(self.lock)
+        self.waiters, self.idle = deque(), deque()
+        self.leases = ContextVar('pooled_context', default=())
+        self.size = self.in_use = self.peak = self.sleeping = 0
+        self.created = self.reused = self.discarded = 0
+        self.waits = self.exhausted = 0
+
+    def _reserve(self, expired):
+        """With the lock held, move idle instances past idle_timeout to
+        expired, then take the most recently used idle instance, or a slot
+        for a new one (:attr:`_create`). Return None if there is neither.
+        """
+        if self.idle_timeout is not None:
+            horizon = perf_counter() - self.idle_timeout
+            while self.idle and self.idle[0][1] < horizon:
+                expired.append(self.idle.popleft()[0])
+                self.size -= 1
+        if self.idle:
+            item = self.idle.pop()[0]
+            self.reused += 1
+        elif self.size < self.maxsize:
+            item = self._create
+            self.size += 1
+        else:
+            return None
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return item
+
+    def _wake(self):
+        """With the lock held, wake one waiting thread and one waiting task;
+        whichever loses the race for the instance waits again.
+        """
+        if self.sleeping:
+            self.available.notify()
+        while self.waiters:
+            loop, future = self.waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(_wake_future, future)
+                break
+
+    def _exhausted(self):
+        """With the lock held, count a failed acquisition and return the
+        error to raise for it.
+        """
+        self.exhausted += 1
+        return RuntimeError('pool of {} instances exhausted'
+                            .format(self.maxsize))
+
+    def _discard(self, instances):
+        with self.lock:
+            self.discarded += len(instances)
+        if self.dispose is not None:
+            for instance in instances:
+                self.dispose(instance)
+
+    def _prepare(self, item):
+        """Validate a reused instance, or create one for a reserved slot."""
+        if item is not self._create:
+            if self.validate is None or self.validate(item):
+                return item
+            self._discard([item])
+        try:
+            instance = self.func(*self.args, **self.kwargs)
+        except BaseException:
+            with self.lock:
+                self.size -= 1
+                self.in_use -= 1
+                self._wake()
+            raise
+        with self.lock:
+            self.created += 1
+        return instance
+
+    def acquire(self):
+        """Take an instance out of the pool; give it back with
+        :meth:`release`.
+        """
+        expired, deadline = [], None
+        try:
+            with self.lock:
+                item = self._reserve(expired)
+                if item is None:
+                    if not self.block:
+                        raise self._exhausted()
+                    self.waits += 1
+                    if self.timeout is not None:
+                        deadline = perf_counter() + self.timeout
+                while item is None:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - perf_counter()
+                        if remaining <= 0:
+                            raise self._exhausted()
+                    self.sleeping += 1
+                    try:
+                        self.available.wait(remaining)
+                    finally:
+                        self.sleeping -= 1
+                    item = self._reserve(expired)
+        finally:
+            if expired:
+                self._discard(expired)
+        if item is self._create or self.validate is not None:
+            return self._prepare(item)
+        return item
+
+    async def acquire_async(self):
+        """Like :meth:`acquire`, but waits without blocking the event loop."""
+        import asyncio  # deferred: asyncio is slow to import
+
+        loop = asyncio.get_event_loop()
+        expired, deadline, waited = [], None, False
+        try:
+            while True:
+                with self.lock:
+                    item = self._reserve(expired)
+                    if item is not None:
+                        break
+                    if not self.block:
+                        raise self._exhausted()
+                    if not waited:
+                        self.waits, waited = self.waits + 1, True
+                        if self.timeout is not None:
+                            deadline = perf_counter() + self.timeout
+                    waiter = loop.create_future()
+                    self.waiters.append((loop, waiter))
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0, deadline - perf_counter())
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    with self.lock:
+                        raise self._exhausted()
+                except BaseException:
+                    # pass on a wake up this task can no longer use
+                    if waiter.done() and not waiter.cancelled():
+                        with self.lock:
+                            self._wake()
+                    raise
+        finally:
+            if expired:
+                self._discard(expired)
+        if item is self._create or self.validate is not None:
+            return self._prepare(item)
+        return item
+
+    def release(self, instance):
+        """Return an instance taken with :meth:`acquire` to the pool."""
+        with self.lock:
+            self.in_use -= 1
+            self.idle.append((instance, perf_counter()))
+            if self.sleeping or self.waiters:
+                self._wake()
+
+    def close(self):
+        """Discard all idle instances."""
+        with self.lock:
+            idle = [instance for instance, _ in self.idle]
+            self.idle.clear()
+            self.size -= len(idle)
+        self._discard(idle)
+
+    def stats(self):
+        """Return a :class:`PoolStats` snapshot: current size, instances in
+        use and idle, the most ever in use at once, counts of instances
+        created, reused and discarded, of acquisitions that had to wait or
+        failed, and the fraction of maxsize in use.
+        """
+        with self.lock:
+            return PoolStats(self.size, self.in_use, len(self.idle),
+                             self.peak, self.created, self.reused,
+                             self.discarded, self.waits, self.exhausted,
+                             self.in_use / self.maxsize)
+
+    def __enter__(self):
+        instance = self.acquire()
+        self.leases.set(self.leases.get() + (instance,))
+        return instance
+
+    def __exit__(self, *exc_info):
+        leases = self.leases.get()
+        self.leases.set(leases[:-1])
+        self.release(leases[-1])
+        return False
+
+    async def __aenter__(self):
+        instance = await self.acquire_async()
+        self.leases.set(self.leases.get() + (instance,))
+        return instance
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
@@ -1,38 +1,92 @@
 # Some functions on sequences and iterables.
 
 __all__ = (
+    'combinations',
     'compact',
     'cons',
     'consume',
+    'dotproduct',
+    'dotproducts',
     'drop',
     'exhaust',
+    'external_sort',
+    'find_cycle',
     'first',
     'flatten',
+    'group_aggregate',
+    'hash_join',
     'ilen',
     'isiterable',
     'iterate',
+    'iterate_n',
     'last',
+    'merge',
+    'merge_join',
+    'merge_unique',
+    'most_similar',
     'nth',
+    'permutations',
     'pick',
+    'powerset',
+    'prefetch',
+    'product',
+    'replayable',
+    'reservoir',
+    'reservoir_sample',
     'split',
     'take',
-    'unique'
+    'topk',
+    'unique',
+    'until_fixed_point',
+    'weighted_reservoir_sample',
+    'where',
+    'with_iter'
 )
 
-from collections import deque, Iterable
+import sys
+
+from array import array
+from collections import deque
+from collections.abc import Iterable
 from functools import partial
-from itertools import combinations, chain, islice, tee
-from operator import mul
+from heapq import merge as heapmerge, nlargest
+from itertools import chain, count, groupby, islice, tee
+from operator import eq, itemgetter, mul
+
+try:
+    from math import sumprod  # Python 3.12+
+except ImportError:
+    sumprod = None
 
 from six.moves import map, filter, filterfalse
 
-from dhaffner.common import compose
+from dhaffner._lazy import lazy
+from dhaffner.profiling import iterator as profiled
+
+
+# Combinatorics, ordering, records, replaying and sampling are loaded from
+# submodules on first use.
+__getattr__, __dir__ = lazy(globals(), {
+    'combinations': 'combinatorics',
+    'external_sort': 'ordering',
+    'group_aggregate': 'records',
+    'hash_join': 'records',
+    'permutations': 'combinatorics',
+    'powerset': 'combinatorics',
+    'product': 'combinatorics',
+    'replayable': 'replaying',
+    'reservoir': 'sampling',
+    'reservoir_sample': 'sampling',
+    'topk': 'ordering',
+    'weighted_reservoir_sample': 'sampling'
+})
 
 
 # Remove false values from sequence.
-compact = partial(filter, bool)
+compact = profiled(0, 'compact')(partial(filter, bool))
 
 
+@profiled(1)
 def cons(element, sequence):
     """Add element to beginning of (possibly infinite) sequence.
     >>> list(cons(1, [2, 3]))
@@ -54,13 +108,85 @@ def consume(iterator, n=None, next=next, islice=islice, deque=deque):
         exhaust(iterator)
 
 
+def _ndarray():
+    """Return numpy.ndarray if NumPy has been imported, else None."""
+    numpy = sys.modules.get('numpy')
+    return None if numpy is None else numpy.ndarray
+
+
+def _sparse_dotproduct(vec1, vec2):
+    """Dot product where at least one vector is a dict mapping index to
+    value; only the keys of the smaller dict are visited.
+    """
+    if not isinstance(vec1, dict) or (isinstance(vec2, dict) and
+                                      len(vec2) < len(vec1)):
+        vec1, vec2 = vec2, vec1
+    if isinstance(vec2, dict):
+        get = vec2.get
+        return sum(v * get(k, 0) for k, v in vec1.items())
+    return sum(v * vec2[k] for k, v in vec1.items())
+
+
+# Sequence types which math.sumprod handles without surprises.
+_dense = (list, tuple, array, range)
+
+
 def dotproduct(vec1, vec2, sum=sum, map=map, mul=mul):
     """
     Compute and return the dot product of two vectors (sequences).
+
+    Dicts are treated as sparse vectors mapping index to value. NumPy arrays
+    use ``numpy.dot``; lists, tuples and ``array.array`` of equal length use
+    ``math.sumprod`` where it is available.
     """
+    if isinstance(vec1, dict) or isinstance(vec2, dict):
+        return _sparse_dotproduct(vec1, vec2)
+
+    ndarray = _ndarray()
+    if ndarray is not None and (isinstance(vec1, ndarray) or
+                                isinstance(vec2, ndarray)):
+        return sys.modules['numpy'].dot(vec1, vec2)
+
+    if (sumprod is not None and isinstance(vec1, _dense) and
+            isinstance(vec2, _dense) and len(vec1) == len(vec2)):
+        return sumprod(vec1, vec2)
+
     return sum(map(mul, vec1, vec2))
 
 
+def dotproducts(matrix, vector):
+    """
+    Return the dot product of each row of matrix with vector, as a list (or
+    an array, if matrix is a NumPy array). Rows must be the same length as
+    vector.
+    """
+    ndarray = _ndarray()
+    if ndarray is not None and isinstance(matrix, ndarray):
+        return sys.modules['numpy'].dot(matrix, vector)
+    if sumprod is not None and isinstance(vector, _dense):
+        return [sumprod(vector, row) if isinstance(row, _dense)
+                else dotproduct(vector, row) for row in matrix]
+    return list(map(partial(dotproduct, vector), matrix))
+
+
+def most_similar(matrix, vector, k=10):
+    """
+    Return the k rows of matrix with the largest dot product with vector, as
+    a list of (row index, score) pairs, best first.
+    """
+    scores = dotproducts(matrix, vector)
+    ndarray = _ndarray()
+    if ndarray is not None and isinstance(scores, ndarray):
+        if k < len(scores):
+            top = sys.modules['numpy'].argpartition(-scores, k - 1)[:k]
+        else:
+            top = range(len(scores))
+        return sorted(((int(i), scores[i]) for i in top),
+                      key=itemgetter(1), reverse=True)
+    return nlargest(k, enumerate(scores), key=itemgetter(1))
+
+
+@profiled(0)
 def drop(iterable, n, islice=islice):
     """
     Drop the first n elements of the given iterable.
@@ -72,6 +198,34 @@ def drop(iterable, n, islice=islice):
 exhaust = deque(maxlen=0).extend
 
 
+def find_cycle(func, x, eq=eq):
+    """Return (mu, lam) for the sequence x, func(x), func(func(x)), ... where
+    mu is the index of the first element of the cycle it eventually enters
+    and lam is the length of that cycle, using Brent's algorithm. Loops
+    forever if the sequence never repeats.
+    """
+    power = lam = 1
+    tortoise, hare = x, func(x)
+    while not eq(tortoise, hare):
+        if power == lam:
+            tortoise = hare
+            power *= 2
+            lam = 0
+        hare = func(hare)
+        lam += 1
+
+    tortoise = hare = x
+    for _ in range(lam):
+        hare = func(hare)
+
+    mu = 0
+    while not eq(tortoise, hare):
+        tortoise, hare = func(tortoise), func(hare)
+        mu += 1
+
+    return mu, lam
+
+
 def first(sequence, default=Ellipsis):
     """Get first element of a sequence"""
     if default is Ellipsis:
@@ -80,8 +234,63 @@ def first(sequence, default=Ellipsis):
         return next(iter(sequence), default)
 
 
-# Flatten a sequence one level of iteration.
-flatten = chain.from_iterable
+# Per atoms tuple, a cache of type -> whether flatten descends into it.
+_nested_types = {}
+
+
+@profiled(0)
+def flatten(iterable, depth=None, atoms=(str, bytes, dict)):
+    """
+    Flatten nested iterables up to depth levels deep (all levels by default),
+    leaving instances of atoms and non-iterables as they are.
+
+    >>> list(flatten([1, [2, [3, 'abc']], {'k': 4}]))
+    [1, 2, 3, 'abc', {'k': 4}]
+    >>> list(flatten([1, [2, [3]]], depth=1))
+    [1, 2, [3]]
+
+    Nesting is tracked with an explicit stack of iterators, so arbitrarily
+    deep inputs do not hit the recursion limit, and whether to descend into
+    an object is decided once per type. Removing str from atoms makes
+    strings flatten to characters, and since a character is itself a string
+    that never terminates.
+    """
+    try:
+        nested = _nested_types[atoms]
+    except KeyError:
+        nested = _nested_types.setdefault(atoms, {})
+
+    def descend(item):
+        cls = type(item)
+        try:
+            return nested[cls]
+        except KeyError:
+            result = nested[cls] = (not issubclass(cls, atoms) and
+                                    isiterable(item, strings=True))
+            return result
+
+    if depth == 1:  # one level: let chain do the per-leaf work in C
+        return chain.from_iterable(
+            item if descend(item) else (item,) for item in iterable
+        )
+    return _flatten(iterable, depth, nested, descend)
+
+
+def _flatten(iterable, depth, nested, descend):
+    stack = [iter(iterable)]
+    push, pop = stack.append, stack.pop
+    while stack:
+        for item in stack[-1]:
+            try:  # inlined fast path of descend(item)
+                nest = nested[type(item)]
+            except KeyError:
+                nest = descend(item)
+            if nest and (depth is None or len(stack) <= depth):
+                push(iter(item))
+                break
+            yield item
+        else:
+            pop()
 
 
 def isiterable(obj, strings=False, isinstance=isinstance, Iterable=Iterable):
@@ -100,6 +309,56 @@ def iterate(func, x):
         yield x
 
 
+def iterate_n(func, x, n, eq=eq, detect=False, memo=False):
+    """Return func applied n times to x.
+
+    With detect=True, Brent's cycle detection watches for the sequence to
+    reach a fixed point or enter a cycle; once it does, the remaining
+    iterations are skipped, so the cost is bounded by the length of the
+    tail and cycle rather than by n. With memo=True as well, every state is
+    kept in a dict instead (states must be hashable), which finds the cycle
+    at its first repeat and answers without re-running it.
+
+    Detection assumes func returns new states that eq compares in full; do
+    not use it with functions that mutate their argument in place.
+    """
+    if not detect:
+        for _ in range(n):
+            x = func(x)
+        return x
+
+    if memo:
+        seen, states = {}, []
+        for step in range(n):
+            if x in seen:
+                mu = seen[x]
+                return states[mu + (n - mu) % (step - mu)]
+            seen[x] = step
+            states.append(x)
+            x = func(x)
+        return x
+
+    if n <= 0:
+        return x
+
+    power = lam = 1
+    tortoise, hare, step = x, func(x), 1
+    while step < n:
+        if eq(tortoise, hare):
+            # hare's state repeats every lam steps from here on.
+            for _ in range((n - step) % lam):
+                hare = func(hare)
+            return hare
+        if power == lam:
+            tortoise = hare
+            power *= 2
+            lam = 0
+        hare = func(hare)
+        step += 1
+        lam += 1
+    return hare
+
+
 def ilen(iterable):
     return sum(1 for x in iterable)
 
@@ -113,6 +372,79 @@ def last(iterable, extend=_last_deque.extend, pop=_last_deque.pop):
     return pop()
 
 
+def merge(*iterables, key=None, reverse=False):
+    """
+    Lazily merge iterables that are each sorted (by key, if given) into one
+    sorted iterator, holding only one item per input at a time in a heap.
+    key and reverse have the same meaning as for sorted().
+    """
+    return heapmerge(*iterables, key=key, reverse=reverse)
+
+
+def merge_unique(*iterables, key=None, reverse=False):
+    """
+    Like :func:`merge`, but yield only the first of each run of items with an
+    equal key. Unlike :func:`unique`, this needs constant memory, because
+    duplicates in sorted inputs are adjacent once merged.
+    """
+    groups = groupby(heapmerge(*iterables, key=key, reverse=reverse), key)
+    return map(next, map(itemgetter(1), groups))
+
+
+_joins = {
+    'inner': (False, False),
+    'left': (True, False),
+    'right': (False, True),
+    'outer': (True, True)
+}
+
+
+def merge_join(left, right, key=None, how='inner'):
+    """
+    Join two iterables sorted by key, yielding (left item, right item) pairs
+    for items with equal keys. how is one of 'inner', 'left', 'right' or
+    'outer'; unmatched items of an outer side are paired with None. Only the
+    current run of equal keys from the right is held in memory.
+    """
+    try:
+        keep_left, keep_right = _joins[how]
+    except KeyError:
+        raise ValueError('how must be one of {}'.format(', '.join(_joins)))
+    return _merge_join(left, right, key, keep_left, keep_right)
+
+
+def _merge_join(left, right, key, keep_left, keep_right):
+    lefts, rights = groupby(left, key), groupby(right, key)
+    lkey, lgroup = next(lefts, (_done, None))
+    rkey, rgroup = next(rights, (_done, None))
+
+    while lkey is not _done and rkey is not _done:
+        if lkey < rkey:
+            if keep_left:
+                for item in lgroup:
+                    yield item, None
+            lkey, lgroup = next(lefts, (_done, None))
+        elif rkey < lkey:
+            if keep_right:
+                for item in rgroup:
+                    yield None, item
+            rkey, rgroup = next(rights, (_done, None))
+        else:
+            matches = list(rgroup)
+            for item in lgroup:
+                for match in matches:
+                    yield item, match
+            lkey, lgroup = next(lefts, (_done, None))
+            rkey, rgroup = next(rights, (_done, None))
+
+    if keep_left and lkey is not _done:
+        for item in chain(lgroup, chain.from_iterable(g for _, g in lefts)):
+            yield item, None
+    if keep_right and rkey is not _done:
+        for item in chain(rgroup, chain.from_iterable(g for _, g in rights)):
+            yield None, item
+
+
 def nth(iterable, n, next=next, islice=islice, default=None):
     """
     Return the nth item or a default value from an iterable.
@@ -122,20 +454,30 @@ def nth(iterable, n, next=next, islice=islice, default=None):
     return next(islice(iterable, n, None), default)
 
 
-def partition(items, predicate=bool):
+def partition(items, predicate=bool, memory_limit=None):
     """
     Partition a given sequence into two  subsequences: those for which
     predicate returns True and those for which it returns False.
 
+    The items one subsequence has read ahead of the other are buffered; pass
+    memory_limit to hold at most that many in memory and spill the rest to
+    disk (see :class:`~dhaffner.iterators.replaying.replayable`).
+
     Source: http://nedbatchelder.com/blog/201306/filter_a_list_into_two_parts.html
     """
-
-    a, b = tee((predicate(item), item) for item in items)
+    tagged = ((predicate(item), item) for item in items)
+    if memory_limit is None:
+        a, b = tee(tagged)
+    else:
+        from dhaffner.iterators.replaying import replayable
+        buffer = replayable(tagged, memory_limit)
+        a, b = buffer.cursor(), buffer.cursor()
     return ((item for pred, item in a if not pred),
             (item for pred, item in b if pred))
 
 
 # TODO: better name for this function
+@profiled(0)
 def pick(iterable):
     """
     Yield elements of sequence, repeating the last element infinitely after
@@ -147,20 +489,67 @@ def pick(iterable):
         yield element
 
 
-def powerset(iterable):
-    """Yields all possible subsets of the iterable
-        >>> list(powerset([1,2,3]))
-        [(), (1,), (2,), (3,), (1, 2), (1, 3), (2, 3), (1, 2, 3)]
+def prefetch(iterable, size=1, timeout=None):
     """
-    s = list(iterable)
-    return chain.from_iterable(combinations(s, r) for r in range(len(s) + 1))
+    Iterate over iterable on a background thread, reading up to size items
+    ahead of the consumer. Exceptions raised by the iterable are re-raised in
+    the consumer. Closing the returned generator (or letting it be collected)
+    stops the background thread after the item it is currently reading, and
+    waits up to timeout seconds (or, if None, as long as it takes) for that
+    read to return. A thread still reading after that is left to finish on
+    its own; the item it reads is discarded.
+    """
+    from queue import Empty, Queue
+    from threading import Event, Thread
+
+    queue, stop = Queue(size), Event()
+
+    def produce(put=queue.put):
+        try:
+            for item in iterable:
+                put((item, None))
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            put((_done, e))
+        else:
+            put((_done, None))
+
+    thread = Thread(target=produce, name='dhaffner.prefetch', daemon=True)
+    thread.start()
+    get = queue.get
+    try:
+        while True:
+            item, error = get()
+            if item is _done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        try:  # unblock the producer if it is waiting on a full queue
+            while True:
+                queue.get_nowait()
+        except Empty:
+            pass
+        thread.join(timeout)
 
 
-# Return a tuple containing the next element in the sequence,
-# and an iterable containing the rest of the sequence.
-split = compose(lambda iterator, next=next: (next(iterator), iterator), iter)
+_prefetch = prefetch  # shadowed by the argument of with_iter
 
+_done = object()
 
+
+def split(iterable, next=next):
+    """Return a tuple containing the next element in the sequence,
+    and an iterable containing the rest of the sequence.
+    """
+    iterator = iter(iterable)
+    return next(iterator), iterator
+
+
+@profiled(1)
 def take(n, iterable, islice=islice):
     """
     Take the first n elements of the given iterable.
@@ -168,6 +557,7 @@ def take(n, iterable, islice=islice):
     return islice(iterable, n)
 
 
+@profiled(0)
 def unique(iterable, filterfalse=filterfalse):
     """
     Return only unique elements from the sequence.
@@ -179,18 +569,52 @@ def unique(iterable, filterfalse=filterfalse):
         yield element
 
 
-def with_iter(contextmanager):
+def with_iter(contextmanager, prefetch=0, blocksize=None):
     """Wrap an iterable in a ``with`` statement, so it closes once exhausted.
     For example, this will close the file when the iterator is exhausted::
         upper_lines = (line.upper() for line in with_iter(open('foo')))
     Any context manager which returns an iterable is a candidate for
     ``with_iter``.
+
+    With prefetch=N, up to N items are read ahead on a background thread
+    (see :func:`prefetch`) so that slow I/O overlaps with processing. With
+    blocksize, the context manager must return a file, which is read about
+    blocksize bytes of whole lines at a time with ``readlines``; with
+    prefetch, N then counts blocks rather than lines. The context manager is
+    exited as soon as the iterator is exhausted, closed or collected, without
+    waiting for a read in progress on the background thread; exiting it
+    usually closes the source, which ends that read.
     """
     with contextmanager as iterable:
-        for item in iterable:
-            yield item
+        if blocksize is not None:
+            iterable = iter(partial(iterable.readlines, blocksize), [])
+        if prefetch:
+            iterable = _prefetch(iterable, prefetch, timeout=0)
+        iterator = iterable
+        if blocksize is not None:
+            iterable = chain.from_iterable(iterable)
+        try:
+            for item in iterable:
+                yield item
+        finally:
+            if prefetch:
+                iterator.close()  # tell the reader to stop, without waiting
+
+
+def until_fixed_point(func, x, eq=eq, limit=None):
+    """Repeatedly apply func to x until the result is equal (per eq) to its
+    input, and return it. Raise RuntimeError if no fixed point is reached
+    within limit iterations.
+    """
+    for _ in (count() if limit is None else range(limit)):
+        y = func(x)
+        if eq(x, y):
+            return y
+        x = y
+    raise RuntimeError('no fixed point after {} iterations'.format(limit))
 
 
+@profiled(0)
 def where(dicts, **kwargs):
     def sift(d):
         for (k, v) in kwargs.items():
@@ -0,0 +1,371 @@
+# Lazy, indexable combinatoric sequences.
+
+__all__ = (
+    'combinations',
+    'permutations',
+    'powerset',
+    'product'
+)
+
+import itertools
+
+from itertools import chain, islice
+from math import comb, perm
+from operator import mul
+
+from six.moves import map, reduce, zip
+
+
+def _indexer(pool):
+    """Return a function mapping a sequence of elements of pool to distinct
+    pool indices, raising ValueError for elements not in pool, or repeated
+    more often than in it. Each element takes the first of its positions
+    not yet taken (and, if increasing is true, after the previous element's),
+    so that an item drawn from a pool with repeated elements maps to where
+    it first occurs in iteration order.
+    """
+    try:
+        index = {}
+        for i, e in enumerate(pool):
+            index.setdefault(e, []).append(i)
+        lookup = index.__getitem__
+    except TypeError:  # unhashable elements
+        def lookup(element):
+            return [i for i, e in enumerate(pool) if e == element]
+
+    def positions(elements, increasing=False):
+        taken, result, low = set(), [], -1
+        for element in elements:
+            try:
+                candidates = lookup(element)
+            except (KeyError, TypeError):
+                candidates = ()
+            for i in candidates:
+                if i > low and i not in taken:
+                    break
+            else:
+                raise ValueError('{!r} is not in the pool'.format(element))
+            taken.add(i)
+            result.append(i)
+            if increasing:
+                low = i
+        return result
+
+    return positions
+
+
+def _subset_positions(positions, item):
+    """Return the sorted pool indices of item, matched in order if possible
+    so that repeated pool elements rank as itertools first yields them, and
+    otherwise in any order.
+    """
+    item = tuple(item)
+    try:
+        return positions(item, increasing=True)
+    except ValueError:
+        return sorted(positions(item))
+
+
+def _unrank_combination(n, r, index):
+    """Return the indices of the index-th r-combination of range(n), in the
+    order produced by :func:`itertools.combinations`.
+    """
+    c, k, indices = comb(n, r), n, []
+    while r:
+        c, k, r = c * r // k, k - 1, r - 1
+        while index >= c:
+            index -= c
+            c, k = c * (k - r) // k, k - 1
+        indices.append(n - 1 - k)
+    return indices
+
+
+def _rank_combination(n, indices):
+    r = len(indices)
+    return comb(n, r) - 1 - sum(
+        comb(n - 1 - i, r - j) for j, i in enumerate(indices)
+    )
+
+
+def _next_combination(indices, n):
+    """Advance indices to the next r-combination in place; return False if
+    it was the last one.
+    """
+    r = len(indices)
+    for i in reversed(range(r)):
+        if indices[i] != i + n - r:
+            break
+    else:
+        return False
+    indices[i] += 1
+    for j in range(i + 1, r):
+        indices[j] = indices[j - 1] + 1
+    return True
+
+
+class _combinatoric(object):  # noqa
+    """Base class for lazy, indexable combinatoric sequences.
+
+    Elements are addressed by their position in the order the equivalent
+    ``itertools`` function produces them. Subclasses represent each element
+    by a list of pool indices (its state) and implement ``_unrank``,
+    ``_rank``, ``_advance``, ``_element`` and ``_indices``; ``size`` is the
+    number of elements, which may be too large for ``len()``.
+    """
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _view(self, range(self.size)[index])
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('index out of range')
+        return self._element(self._unrank(index))
+
+    def __contains__(self, item):
+        try:
+            self.rank(item)
+        except ValueError:
+            return False
+        return True
+
+    def rank(self, item):
+        """Return the position of item; the inverse of indexing."""
+        return self._rank(self._indices(item))
+
+    index = rank
+
+    def iterfrom(self, start=0, stop=None):
+        """Yield the elements from position start up to stop, stepping from
+        one to the next without unranking each of them.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return
+        state = self._unrank(start)
+        yield self._element(state)
+        for _ in range(stop - start - 1):
+            self._advance(state)
+            yield self._element(state)
+
+    def shard(self, i, count):
+        """Return the i-th of count contiguous, near-equal slices."""
+        return self[i * self.size // count:(i + 1) * self.size // count]
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.pool)
+
+
+class _view(object):  # noqa
+    """A lazy slice of a combinatoric sequence."""
+
+    def __init__(self, parent, positions):
+        self.parent, self.positions = parent, positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _view(self.parent, self.positions[index])
+        return self.parent[self.positions[index]]
+
+    def __iter__(self):
+        positions = self.positions
+        if positions.step == 1:
+            return self.parent.iterfrom(positions.start, positions.stop)
+        return map(self.parent.__getitem__, positions)
+
+    def __repr__(self):
+        return '{!r}[{}:{}:{}]'.format(self.parent, self.positions.start,
+                                       self.positions.stop,
+                                       self.positions.step)
+
+
+class combinations(_combinatoric):  # noqa
+    """Lazy, indexable equivalent of :func:`itertools.combinations`.
+
+    >>> c = combinations('abcd', 2)
+    >>> len(c), c[4], c.rank(('b', 'd'))
+    (6, ('b', 'd'), 4)
+    """
+
+    def __init__(self, iterable, r):
+        self.pool, self.r = tuple(iterable), r
+        self.size = comb(len(self.pool), r)
+        self._positions = _indexer(self.pool)
+
+    def __iter__(self):
+        return itertools.combinations(self.pool, self.r)
+
+    def _unrank(self, index):
+        return _unrank_combination(len(self.pool), self.r, index)
+
+    def _rank(self, indices):
+        return _rank_combination(len(self.pool), indices)
+
+    def _advance(self, state):
+        _next_combination(state, len(self.pool))
+
+    def _element(self, state):
+        pool = self.pool
+        return tuple(pool[i] for i in state)
+
+    def _indices(self, item):
+        indices = _subset_positions(self._positions, item)
+        if len(indices) != self.r:
+            raise ValueError('{!r} is not a combination'.format(item))
+        return indices
+
+    def __repr__(self):
+        return 'combinations({!r}, {})'.format(self.pool, self.r)
+
+
+class permutations(_combinatoric):  # noqa
+    """Lazy, indexable equivalent of :func:`itertools.permutations`."""
+
+    def __init__(self, iterable, r=None):
+        self.pool = tuple(iterable)
+        self.r = len(self.pool) if r is None else r
+        self.size = perm(len(self.pool), self.r)
+        self._positions = _indexer(self.pool)
+
+    def __iter__(self):
+        return itertools.permutations(self.pool, self.r)
+
+    def _unrank(self, index):
+        n, r = len(self.pool), self.r
+        available, state = list(range(n)), []
+        for j in range(r):
+            i, index = divmod(index, perm(n - j - 1, r - j - 1))
+            state.append(available.pop(i))
+        return state
+
+    def _rank(self, indices):
+        n, r = len(self.pool), self.r
+        available, rank = list(range(n)), 0
+        for j, i in enumerate(indices):
+            rank += available.index(i) * perm(n - j - 1, r - j - 1)
+            available.remove(i)
+        return rank
+
+    def _advance(self, state):
+        n, r = len(self.pool), self.r
+        used = set(state)
+        for j in reversed(range(r)):
+            used.discard(state[j])
+            for value in range(state[j] + 1, n):
+                if value not in used:
+                    state[j] = value
+                    used.add(value)
+                    rest = (v for v in range(n) if v not in used)
+                    state[j + 1:] = islice(rest, r - j - 1)
+                    return
+
+    def _element(self, state):
+        pool = self.pool
+        return tuple(pool[i] for i in state)
+
+    def _indices(self, item):
+        indices = self._positions(item)
+        if len(indices) != self.r:
+            raise ValueError('{!r} is not a permutation'.format(item))
+        return indices
+
+    def __repr__(self):
+        return 'permutations({!r}, {})'.format(self.pool, self.r)
+
+
+class product(_combinatoric):  # noqa
+    """Lazy, indexable equivalent of :func:`itertools.product`."""
+
+    def __init__(self, *iterables, repeat=1):
+        self.pool = tuple(map(tuple, iterables)) * repeat
+        self.size = reduce(mul, map(len, self.pool), 1)
+        self._positions = list(map(_indexer, self.pool))
+
+    def __iter__(self):
+        return itertools.product(*self.pool)
+
+    def _unrank(self, index):
+        state = []
+        for pool in reversed(self.pool):
+            index, i = divmod(index, len(pool))
+            state.append(i)
+        state.reverse()
+        return state
+
+    def _rank(self, indices):
+        rank = 0
+        for pool, i in zip(self.pool, indices):
+            rank = rank * len(pool) + i
+        return rank
+
+    def _advance(self, state):
+        for j in reversed(range(len(state))):
+            state[j] += 1
+            if state[j] < len(self.pool[j]):
+                return
+            state[j] = 0
+
+    def _element(self, state):
+        return tuple(pool[i] for pool, i in zip(self.pool, state))
+
+    def _indices(self, item):
+        item = tuple(item)
+        if len(item) != len(self.pool):
+            raise ValueError('{!r} is not in the product'.format(item))
+        return [positions((e,))[0]
+                for positions, e in zip(self._positions, item)]
+
+    def __repr__(self):
+        return 'product(*{!r})'.format(self.pool)
+
+
+class powerset(_combinatoric):  # noqa
+    """All possible subsets of the iterable, as a lazy, indexable sequence
+    ordered by size and then as :func:`itertools.combinations` orders them.
+        >>> list(powerset([1,2,3]))
+        [(), (1,), (2,), (3,), (1, 2), (1, 3), (2, 3), (1, 2, 3)]
+        >>> powerset([1,2,3])[5], powerset([1,2,3]).rank((3, 1))
+        ((1, 3), 5)
+    """
+
+    def __init__(self, iterable):
+        self.pool = tuple(iterable)
+        self.size = 2 ** len(self.pool)
+        self._positions = _indexer(self.pool)
+
+    def __iter__(self):
+        s = self.pool
+        return chain.from_iterable(
+            itertools.combinations(s, r) for r in range(len(s) + 1)
+        )
+
+    def _unrank(self, index):
+        n = len(self.pool)
+        r, c = 0, 1  # c = comb(n, r)
+        while index >= c:
+            index -= c
+            c = c * (n - r) // (r + 1)
+            r += 1
+        return _unrank_combination(n, r, index)
+
+    def _rank(self, indices):
+        n, r = len(self.pool), len(indices)
+        return (sum(comb(n, j) for j in range(r)) +
+                _rank_combination(n, indices))
+
+    def _advance(self, state):
+        if not _next_combination(state, len(self.pool)):
+            state[:] = range(len(state) + 1)
+
+    def _element(self, state):
+        pool = self.pool
+        return tuple(pool[i] for i in state)
+
+    def _indices(self, item):
+        return _subset_positions(self._positions, item)
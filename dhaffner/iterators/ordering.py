@@ -0,0 +1,116 @@
+# Sorting and selection over iterables larger than memory.
+
+__all__ = (
+    'external_sort',
+    'topk'
+)
+
+from heapq import heapify, heapreplace, merge as heapmerge
+from itertools import islice
+
+
+def topk(iterable, k, key=None):
+    """
+    Return the k largest items of iterable, largest first; equivalent to
+    ``sorted(iterable, key=key, reverse=True)[:k]`` but holding only k items
+    in a heap. The smallest of the k is cached in a local, so an item that
+    cannot enter costs a single comparison and no heap operation.
+    """
+    if k <= 0:
+        return []
+    it = iter(iterable)
+
+    if key is None:
+        heap = list(islice(it, k))
+        heapify(heap)
+        if heap:
+            top = heap[0]
+            for item in it:
+                if top < item:
+                    heapreplace(heap, item)
+                    top = heap[0]
+        heap.sort(reverse=True)
+        return heap
+
+    # Decorate with a decreasing index so ties keep their input order.
+    heap = [(key(item), -i, item) for i, item in zip(range(k), it)]
+    heapify(heap)
+    if heap:
+        top = heap[0][0]
+        for i, item in enumerate(it, k):
+            value = key(item)
+            if top < value:
+                heapreplace(heap, (value, -i, item))
+                top = heap[0][0]
+    heap.sort(reverse=True)
+    return [item for _, _, item in heap]
+
+
+def external_sort(iterable, key=None, reverse=False, memory_limit=100000,
+                  fan_in=16):
+    """
+    Lazily yield the items of iterable in sorted order, holding at most
+    memory_limit items in memory at once. The input is cut into runs of
+    memory_limit items, each sorted in memory and spilled to a temporary
+    file as batches of pickled items; the runs are then read back and
+    merged with :func:`~dhaffner.iterators.merge`. Input that fits in one
+    run is never written to disk. The sort is stable.
+
+    At most fan_in runs are merged at a time: whenever fan_in runs of the
+    same size have been spilled they are merged into one larger run, so the
+    number of open files grows only logarithmically with the input.
+    """
+    if memory_limit < 1:
+        raise ValueError('memory_limit must be at least 1')
+    if fan_in < 2:
+        raise ValueError('fan_in must be at least 2')
+    it = iter(iterable)
+    run = list(islice(it, memory_limit))
+    run.sort(key=key, reverse=reverse)
+    if len(run) < memory_limit:
+        return iter(run)
+
+    # levels[i] holds, oldest first, runs merged from fan_in ** i spilled
+    # runs; every run on a level is older than those on the levels below.
+    levels = []
+    while run:
+        f, level = _spill_run(run), 0
+        del run[:]
+        while True:
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(f)
+            if len(levels[level]) < fan_in:
+                break
+            merged = heapmerge(*map(_read_run, levels[level]), key=key,
+                               reverse=reverse)
+            f, levels[level] = _spill_run(merged), []
+            level += 1
+        run = list(islice(it, memory_limit))
+        run.sort(key=key, reverse=reverse)
+    runs = [f for level in reversed(levels) for f in level]
+    return heapmerge(*map(_read_run, runs), key=key, reverse=reverse)
+
+
+def _spill_run(items, batch=1024):
+    from pickle import dump
+    from tempfile import TemporaryFile
+
+    f, it = TemporaryFile(), iter(items)
+    for chunk in iter(lambda: list(islice(it, batch)), []):
+        dump(chunk, f, -1)
+    f.seek(0)
+    return f
+
+
+def _read_run(f):
+    from pickle import load
+
+    with f:
+        while True:
+            try:
+                batch = load(f)
+            except EOFError:
+                return
+            for item in batch:
+                yield item
@@ -0,0 +1,176 @@
+# Joins and aggregation over iterables of records (dicts).
+
+__all__ = (
+    'group_aggregate',
+    'hash_join'
+)
+
+from operator import itemgetter
+
+from six.moves import zip
+
+from dhaffner.iterators import _done
+
+
+def _keygetter(on):
+    """Return a function extracting the key field(s) on from a record."""
+    if isinstance(on, (tuple, list)):
+        return itemgetter(*on)
+    return itemgetter(on)
+
+
+def hash_join(build, probe, on):
+    """
+    Inner-join two iterables of dicts on the key field (or tuple of fields)
+    on, yielding one merged dict per matching pair; fields from probe win on
+    conflict. The build side is loaded into a hash table and the probe side
+    is streamed, so build should be the smaller one; if both have a length,
+    the smaller is built regardless of argument order.
+    """
+    key = _keygetter(on)
+    swapped = False
+    try:
+        if len(build) > len(probe):
+            build, probe, swapped = probe, build, True
+    except TypeError:  # not sized
+        pass
+
+    table = {}
+    for record in build:
+        table.setdefault(key(record), []).append(record)
+
+    for record in probe:
+        for match in table.get(key(record), ()):
+            merged = dict(record if swapped else match)
+            merged.update(match if swapped else record)
+            yield merged
+
+
+# name -> (initial state, step(state, value), final(state) or None)
+_aggregates = {
+    'count': (0, lambda state, value: state + 1, None),
+    'sum': (0, lambda state, value: state + value, None),
+    'min': (_done, lambda s, v: v if s is _done or v < s else s, None),
+    'max': (_done, lambda s, v: v if s is _done or v > s else s, None),
+    'mean': ((0, 0), lambda s, v: (s[0] + v, s[1] + 1),
+             lambda s: s[0] / s[1]),
+    'first': (_done, lambda s, v: v if s is _done else s, None),
+    'last': (None, lambda s, v: v, None)
+}
+
+
+def group_aggregate(records, by, aggs, max_groups=None, partitions=16):
+    """
+    Group an iterable of dicts by the field (or tuple of fields) by and
+    yield one dict per group with the by fields and the aggregates in aggs.
+
+    aggs maps an output field to an aggregate name ('count', 'sum', 'min',
+    'max', 'mean', 'first' or 'last') of the field of the same name, or to a
+    (field, name) pair::
+
+        group_aggregate(rows, 'user', {'bytes': 'sum', 'n': ('bytes', 'count')})
+
+    Only a running accumulator is kept per group. If max_groups is given and
+    more distinct groups than that turn up, records for new groups are
+    spilled to temporary files, hash partitioned so that every group lands
+    in one partition, and each partition is then aggregated in turn.
+    """
+    if max_groups is not None and max_groups < 1:
+        raise ValueError('max_groups must be at least 1')
+    plan = _aggregate_plan(aggs)
+    return _group_aggregate(records, by, plan, max_groups, partitions, 0)
+
+
+def _aggregate_plan(aggs):
+    """Return the output fields, initial states, (getter, step) columns and
+    finalizers for aggs, raising ValueError for unknown aggregates.
+    """
+    outputs, getters, steps, initial, finals = [], [], [], [], []
+    for output, spec in aggs.items():
+        field, name = spec if isinstance(spec, tuple) else (output, spec)
+        try:
+            init, step, final = _aggregates[name]
+        except KeyError:
+            raise ValueError('unknown aggregate {!r}'.format(name))
+        outputs.append(output)
+        getters.append((lambda record: None) if name == 'count'
+                       else itemgetter(field))
+        steps.append(step)
+        initial.append(init)
+        finals.append(final)
+    return outputs, initial, list(zip(getters, steps)), finals
+
+
+def _group_aggregate(records, by, plan, max_groups, partitions, level):
+    key = _keygetter(by)
+    fields = by if isinstance(by, (tuple, list)) else (by,)
+    outputs, initial, columns, finals = plan
+
+    groups, spill = {}, None
+    for record in records:
+        k = key(record)
+        state = groups.get(k)
+        if state is None:
+            if max_groups is not None and len(groups) >= max_groups:
+                if spill is None:
+                    spill = _Spill(partitions, level)
+                spill.add(k, record)
+                continue
+            state = groups[k] = list(initial)
+        for i, (get, step) in enumerate(columns):
+            state[i] = step(state[i], get(record))
+
+    if len(fields) == 1:
+        keyfields = lambda k: ((fields[0], k),)
+    else:
+        keyfields = lambda k: zip(fields, k)
+
+    for k, state in groups.items():
+        result = dict(keyfields(k))
+        for output, value, final in zip(outputs, state, finals):
+            result[output] = value if final is None else final(value)
+        yield result
+
+    if spill is not None:
+        del groups
+        for partition in spill:
+            for result in _group_aggregate(partition, by, plan, max_groups,
+                                           partitions, level + 1):
+                yield result
+
+
+class _Spill(object):
+    """Hash partitioned temporary files of pickled records."""
+
+    def __init__(self, partitions, level):
+        from pickle import Pickler
+        from tempfile import TemporaryFile
+
+        self.level = level
+        self.files = [TemporaryFile() for _ in range(partitions)]
+        self.picklers = [Pickler(f, -1) for f in self.files]
+
+    def add(self, key, record):
+        # Salt by level so a partition that overflows again splits further.
+        i = hash((self.level, key)) % len(self.files)
+        self.picklers[i].dump(record)
+        self.picklers[i].clear_memo()
+
+    def __iter__(self):
+        from pickle import Unpickler
+
+        for f in self.files:
+            with f:
+                f.seek(0)
+                load = Unpickler(f).load
+                yield _unpickled(load)
+
+        del self.files[:], self.picklers[:]
+
+
+def _unpickled(load):
+    while True:
+        try:
+            yield load()
+        except EOFError:
+            return
@@ -0,0 +1,153 @@
+# Buffering an iterable for several independent readers.
+
+__all__ = (
+    'replayable',
+)
+
+from itertools import islice
+
+
+class replayable(object):  # noqa
+    """
+    Buffer an iterable so that it can be read by several independent
+    cursors, e.g. for a multi-pass algorithm or to share a stream between
+    consumers that advance at different rates.
+
+    Items are pulled from iterable in chunks as the furthest cursor needs
+    them. Up to memory_limit items are held in memory; chunks beyond that
+    are appended to a temporary file in spill_dir, a new one every
+    segment_bytes, and read back a chunk at a time. A chunk is released
+    once every open cursor has passed it, so create all the cursors needed
+    before reading from any of them::
+
+        buffer = replayable(stream)
+        first, second = buffer.cursor(), buffer.cursor()
+
+    Not thread-safe.
+    """
+    segment_bytes = 64 << 20  # start a new spill file after this many bytes
+
+    def __init__(self, iterable, memory_limit=100000, spill_dir=None,
+                 chunksize=1024):
+        self.source = iter(iterable)
+        self.memory_limit, self.spill_dir = memory_limit, spill_dir
+        self.chunksize = max(1, min(chunksize, memory_limit))
+        self.chunks = {}  # index -> list, or (segment, offset) if spilled
+        self.first = self.last = 0  # retained chunks are [first, last)
+        self.in_memory = self.spilled = 0  # items in memory, chunks on disk
+        self.cursors = {}  # token -> index of the chunk being read
+        self.segments = {}  # spill file -> number of retained chunks in it
+        self.segment = None  # the spill file being appended to
+
+    def cursor(self):
+        """Return an iterator over the buffered iterable from its start."""
+        from weakref import finalize
+
+        if self.first:
+            raise ValueError('items before {} have been released'
+                             .format(self.first * self.chunksize))
+        token = object()
+        self.cursors[token] = 0
+        reader = self._read(token)
+        finalize(reader, self._close_cursor, token)
+        return reader
+
+    __iter__ = cursor
+
+    def _read(self, token):
+        index, cursors = 0, self.cursors
+        try:
+            while True:
+                chunk = self._load(index)
+                if chunk is None:
+                    return
+                for item in chunk:
+                    yield item
+                index += 1
+                cursors[token] = index
+                if self.first < index:
+                    self._release()
+        finally:
+            self._close_cursor(token)
+
+    def _close_cursor(self, token):
+        if self.cursors.pop(token, None) is not None:
+            self._release()
+
+    def _load(self, index):
+        if index < self.first:  # closed
+            return None
+        while index >= self.last:
+            if not self._fill():
+                return None
+        chunk = self.chunks[index]
+        if chunk.__class__ is list:
+            return chunk
+        from pickle import load
+
+        segment, offset = chunk
+        segment.seek(offset)
+        return load(segment)
+
+    def _fill(self):
+        chunk = list(islice(self.source, self.chunksize))
+        if not chunk:
+            return False
+        if self.in_memory + len(chunk) <= self.memory_limit:
+            self.chunks[self.last] = chunk
+            self.in_memory += len(chunk)
+        else:
+            self.chunks[self.last] = self._spill(chunk)
+        self.last += 1
+        return True
+
+    def _spill(self, chunk):
+        from pickle import dump
+
+        segment = self.segment
+        if segment is not None:
+            offset = segment.seek(0, 2)
+        if segment is None or offset >= self.segment_bytes:
+            if segment is not None and not self.segments[segment]:
+                del self.segments[segment]  # every chunk already released
+                segment.close()
+            from tempfile import TemporaryFile
+            segment = self.segment = TemporaryFile(dir=self.spill_dir)
+            self.segments[segment], offset = 0, 0
+        dump(chunk, segment, -1)
+        self.segments[segment] += 1
+        self.spilled += 1
+        return segment, offset
+
+    def _release(self):
+        """Drop the chunks every open cursor has passed."""
+        if not self.cursors:
+            return
+        low = min(self.cursors.values())
+        chunks, segments = self.chunks, self.segments
+        for index in range(self.first, low):
+            chunk = chunks.pop(index)
+            if chunk.__class__ is list:
+                self.in_memory -= len(chunk)
+                continue
+            segment = chunk[0]
+            segments[segment] -= 1
+            self.spilled -= 1
+            if not segments[segment] and segment is not self.segment:
+                del segments[segment]
+                segment.close()
+        if low > self.first:
+            self.first = low
+
+    def close(self):
+        """Stop reading iterable, release everything and delete the spill
+        files. Open cursors stop at the end of their current chunk.
+        """
+        self.source = iter(())
+        self.chunks.clear()
+        self.in_memory = self.spilled = 0
+        for segment in self.segments:
+            segment.close()
+        self.segments.clear()
+        self.segment = None
+        self.first = self.last
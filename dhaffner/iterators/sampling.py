@@ -0,0 +1,171 @@
+# Random sampling from iterables in one pass.
+
+__all__ = (
+    'reservoir',
+    'reservoir_sample',
+    'weighted_reservoir_sample'
+)
+
+from heapq import heapify, heapreplace
+from itertools import count, islice
+from math import exp, log, log1p
+
+from six.moves import zip
+
+from dhaffner.iterators import _done, exhaust, ilen
+
+
+def _random(rng):
+    """Return a uniform random float in the open interval (0, 1)."""
+    u = rng.random()
+    while not u:
+        u = rng.random()
+    return u
+
+
+class reservoir(object):  # noqa
+    """
+    A uniform random sample of at most k items from everything passed to
+    :meth:`extend`, using Vitter's Algorithm L: after the reservoir is full,
+    the number of items to skip before the next replacement is drawn
+    directly, so the random number generator is called O(k log(n/k)) times
+    rather than once per item, and skipped items are consumed in C.
+
+    Reservoirs filled independently (e.g. one per worker process) can be
+    combined with :meth:`merge` into a uniform sample of all their items.
+    """
+
+    def __init__(self, k, seed=None):
+        from random import Random
+
+        self.k, self.count, self.sample = k, 0, []
+        self.rng = Random(seed)
+        self.w, self.skip = 1.0, 0
+
+    def _advance(self):
+        rng, k = self.rng, self.k
+        self.w *= exp(log(_random(rng)) / k)
+        self.skip = int(log(_random(rng)) / log1p(-self.w))
+
+    def extend(self, iterable):
+        it, k, sample = iter(iterable), self.k, self.sample
+        if k <= 0:
+            self.count += ilen(it)
+            return self
+
+        if len(sample) < k:
+            before = len(sample)
+            sample.extend(islice(it, k - before))
+            self.count += len(sample) - before
+            if len(sample) < k:
+                return self
+            self._advance()
+
+        randrange = self.rng.randrange
+        while True:
+            counter = count()
+            exhaust(zip(islice(it, self.skip), counter))
+            skipped = next(counter)
+            self.count += skipped
+            self.skip -= skipped
+            if self.skip:
+                return self  # ran out of input while skipping
+            item = next(it, _done)
+            if item is _done:
+                return self
+            self.count += 1
+            sample[randrange(k)] = item
+            self._advance()
+
+    def add(self, item):
+        return self.extend((item,))
+
+    def merge(self, other):
+        """Return a new reservoir holding a uniform sample of the items seen
+        by both self and other, which must have the same k.
+        """
+        if self.k != other.k:
+            raise ValueError('cannot merge reservoirs of different sizes')
+        merged = reservoir(self.k)
+        merged.rng = rng = self.rng
+        merged.count = n = self.count + other.count
+
+        # How many of the k items come from each side is hypergeometric.
+        left, right = self.count, other.count
+        take = min(self.k, n)
+        from_left = 0
+        for i in range(take):
+            if rng.random() * (left + right) < left:
+                from_left += 1
+                left -= 1
+            else:
+                right -= 1
+        merged.sample = (rng.sample(self.sample, from_left) +
+                         rng.sample(other.sample, take - from_left))
+        rng.shuffle(merged.sample)
+
+        if take == self.k > 0:
+            # The k-th smallest of n uniform tags, as Algorithm L tracks it.
+            merged.w = rng.betavariate(self.k, n - self.k + 1)
+            merged.skip = int(log(_random(rng)) / log1p(-merged.w))
+        return merged
+
+    def __iter__(self):
+        return iter(self.sample)
+
+    def __len__(self):
+        return len(self.sample)
+
+    def __repr__(self):
+        return 'reservoir({}, count={}, sample={!r})'.format(
+            self.k, self.count, self.sample)
+
+
+def reservoir_sample(iterable, k, seed=None):
+    """Return a uniform random sample of k items from iterable (or all of
+    them, if there are fewer) in one pass, without holding the iterable in
+    memory. See :class:`reservoir`.
+    """
+    return reservoir(k, seed).extend(iterable).sample
+
+
+def weighted_reservoir_sample(iterable, k, weight, seed=None):
+    """
+    Return a random sample of k items from iterable in one pass, where each
+    item's chance of being included is proportional to weight(item), using
+    Efraimidis and Spirakis' A-ExpJ: like Algorithm L, it draws how much
+    total weight to skip before the next replacement instead of drawing a
+    random key per item. Keys are kept as logarithms so small weights do
+    not underflow. Items whose weight is not positive are never selected.
+    """
+    from random import Random
+
+    rng = Random(seed)
+    it, heap = iter(iterable), []
+    if k > 0:
+        for item in it:
+            w = weight(item)
+            if w > 0:
+                heap.append((log(_random(rng)) / w, len(heap), item))
+                if len(heap) == k:
+                    break
+    heapify(heap)
+    if len(heap) < k or not k:
+        return [item for _, _, item in heap]
+
+    tiebreak = k
+    threshold = heap[0][0]  # log of the smallest key
+    skip = log(_random(rng)) / threshold
+    for item in it:
+        w = weight(item)
+        if w <= 0:
+            continue
+        skip -= w
+        if skip <= 0:
+            t = exp(threshold * w)
+            key = log(t + (1.0 - t) * _random(rng)) / w
+            tiebreak += 1
+            heapreplace(heap, (key, tiebreak, item))
+            threshold = heap[0][0]
+            skip = log(_random(rng)) / threshold
+    return [item for _, _, item in heap]
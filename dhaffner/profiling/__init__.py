@@ -0,0 +1,278 @@
+'''
+Opt-in profiling of composed functions and iterator pipelines.
+
+Profiling is off by default. Turn it on for the whole process by setting the
+``DHAFFNER_PROFILE`` environment variable to anything but an empty string,
+``0``, ``false``, ``no`` or ``off``, or for a block of code with::
+
+    with profile() as report:
+        pipeline = compose(f, g, h)
+        pipeline(x)
+    print(report)
+
+Functions built by ``compose``, ``juxt`` and ``pipe`` while profiling is on
+have each stage wrapped so that it records its call count and cumulative
+time into the report that was current when they were built. Functions built
+while it is off are left exactly as they were, so there is no per-call
+overhead. Lazy helpers in ``dhaffner.iterators`` also
+record how many items they pulled from their input and yielded to their
+consumer. The time recorded for a lazy stage includes the time spent in the
+stages upstream of it. Their module attributes are only bound to the
+counting wrappers while profiling is on, so code holding a reference taken
+while it was off is not profiled.
+'''
+
+__all__ = (
+    'Report',
+    'Stage',
+    'add_sink',
+    'enabled',
+    'instrument',
+    'iterator',
+    'profile',
+    'remove_sink',
+    'report'
+)
+
+import os
+import sys
+
+from functools import wraps
+from time import perf_counter
+
+
+class Stage(object):
+    """Counters for a single named stage."""
+    __slots__ = ('name', 'calls', 'time', 'items_in', 'items_out')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = self.items_in = self.items_out = 0
+        self.time = 0.0
+
+    def as_dict(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+    def __repr__(self):
+        return ('Stage({name!r}, calls={calls}, time={time:.6f}, '
+                'items_in={items_in}, items_out={items_out})'
+                .format(**self.as_dict()))
+
+
+class Report(object):
+    """A collection of :class:`Stage` counters, keyed by stage name."""
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name):
+        try:
+            return self.stages[name]
+        except KeyError:
+            stage = self.stages[name] = Stage(name)
+            return stage
+
+    def record(self, name, elapsed, items_in=1, items_out=1):
+        stage = self.stage(name)
+        stage.calls += 1
+        stage.time += elapsed
+        stage.items_in += items_in
+        stage.items_out += items_out
+
+    def reset(self):
+        self.stages.clear()
+
+    def as_dict(self):
+        return dict((name, stage.as_dict())
+                    for name, stage in self.stages.items())
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def __iter__(self):
+        return iter(sorted(self.stages.values(), key=lambda s: -s.time))
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __str__(self):
+        lines = ['{:<40} {:>8} {:>12} {:>10} {:>10}'.format(
+            'stage', 'calls', 'time (s)', 'in', 'out')]
+        for s in self:
+            lines.append('{:<40} {:>8} {:>12.6f} {:>10} {:>10}'.format(
+                s.name[:40], s.calls, s.time, s.items_in, s.items_out))
+        return '\n'.join(lines)
+
+
+_off = ('', '0', 'false', 'no', 'off')
+
+
+class _State(object):
+    def __init__(self):
+        value = os.environ.get('DHAFFNER_PROFILE', '')
+        self.enabled = value.strip().lower() not in _off
+        self.report = Report()
+        self.sinks = []
+        self.helpers = []  # (namespace, plain, wrapper) of iterator helpers
+
+    def set(self, enabled, report):
+        if enabled != self.enabled:
+            for namespace, plain, wrapper in self.helpers:
+                old, new = (plain, wrapper) if enabled else (wrapper, plain)
+                for key, value in list(namespace.items()):
+                    if value is old:
+                        namespace[key] = new
+        self.enabled, self.report = enabled, report
+
+
+_state = _State()
+
+
+def enabled():
+    """Return whether newly built pipelines will be instrumented."""
+    return _state.enabled
+
+
+def report():
+    """Return the report that instrumented stages currently record into."""
+    return _state.report
+
+
+def add_sink(sink):
+    """Register a callable to be called as ``sink(name, elapsed, items_in,
+    items_out)`` every time an instrumented stage finishes. Useful to forward
+    timings to an external metrics system.
+    """
+    _state.sinks.append(sink)
+
+
+def remove_sink(sink):
+    _state.sinks.remove(sink)
+
+
+def _record(report, name, elapsed, items_in=1, items_out=1):
+    report.record(name, elapsed, items_in, items_out)
+    for sink in _state.sinks:
+        sink(name, elapsed, items_in, items_out)
+
+
+class profile(object):  # noqa
+    """Context manager enabling profiling and collecting into a fresh
+    :class:`Report`, which is returned on entry. An optional sink is
+    registered for the duration of the block.
+    """
+    def __init__(self, sink=None):
+        self.report = Report()
+        self.sink = sink
+
+    def __enter__(self):
+        self.saved = _state.enabled, _state.report
+        _state.set(True, self.report)
+        if self.sink is not None:
+            add_sink(self.sink)
+        return self.report
+
+    def __exit__(self, *exc_info):
+        _state.set(*self.saved)
+        if self.sink is not None:
+            remove_sink(self.sink)
+        return False
+
+
+def stagename(func):
+    """Return a readable name for func; lambdas get their line number."""
+    name = getattr(func, '__qualname__', getattr(func, '__name__', None))
+    if name is None:
+        return repr(func)
+    code = getattr(func, '__code__', None)
+    if name.endswith('<lambda>') and code is not None:
+        name = '{}:{}'.format(name, code.co_firstlineno)
+    module = getattr(func, '__module__', None)
+    return '{}.{}'.format(module, name) if module else name
+
+
+def instrument(func, name=None, clock=perf_counter):
+    """Wrap func so each call is recorded as a stage in the current report.
+    Already instrumented functions are returned unchanged.
+    """
+    if getattr(func, '__profiled__', False):
+        return func
+    if name is None:
+        name = stagename(func)
+    report = _state.report
+
+    def profiled(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(report, name, clock() - start)
+
+    profiled.__profiled__ = True
+    profiled.__wrapped__ = func
+    profiled.__name__ = getattr(func, '__name__', name)
+    return profiled
+
+
+class _Counted(object):
+    """Iterator that counts the items pulled through it."""
+    __slots__ = ('iterator', 'count')
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.iterator)
+        self.count += 1
+        return item
+
+    next = __next__
+
+
+def _measure(report, name, counted, iterable, clock=perf_counter):
+    iterator = iter(iterable)
+    elapsed, items_out = 0.0, 0
+    try:
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += clock() - start
+            items_out += 1
+            yield item
+    finally:
+        _record(report, name, elapsed, counted.count, items_out)
+
+
+def iterator(position=0, name=None):
+    """Decorate a lazy iterator helper whose input iterable is the positional
+    argument at position. While profiling is enabled, each call records items
+    in, items out and the time spent producing items.
+
+    The helper itself is returned while profiling is off, so that it costs
+    nothing extra; the counting wrapper replaces it in the calling module's
+    namespace whenever profiling is turned on.
+    """
+    def decorator(func):
+        label = name or stagename(func)
+        namespace = sys._getframe(1).f_globals
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled or len(args) <= position:
+                return func(*args, **kwargs)
+            args = list(args)
+            counted = args[position] = _Counted(args[position])
+            return _measure(_state.report, label, counted,
+                            func(*args, **kwargs))
+
+        _state.helpers.append((namespace, func, wrapper))
+        return wrapper if _state.enabled else func
+
+    return decorator
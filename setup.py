@@ -8,11 +8,13 @@ setup(name='dhaffner',
       author_email='dh@xix.org',
       license='MIT',
       packages=[
+          'dhaffner',
           'dhaffner.builtins',
           'dhaffner.common',
           'dhaffner.functions',
           'dhaffner.iterators',
-          'dhaffner.misc'
+          'dhaffner.misc',
+          'dhaffner.profiling'
       ],
       install_requires=[
           'six'
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
-from dhaffner import common
+from dhaffner import common, profiling
 
+import operator
+import pickle
 import unittest
 
 
@@ -18,3 +20,11 @@ class TestCommon(unittest.TestCase):
     def test_compose(self):
         c = common.compose(lambda x: x + 2, lambda y: y ** 2)
         self.assertEqual(c(12), 146)
+
+    @unittest.skipIf(profiling.enabled(), 'instrumented stages do not pickle')
+    def test_compose_pickle(self):
+        for funcs in [(abs, operator.neg), (str, abs, operator.neg)]:
+            c = pickle.loads(pickle.dumps(common.compose(*funcs)))
+            self.assertEqual(c(3), funcs[0](3))
+        self.assertEqual(common.compose(abs), abs)
+        self.assertRaises(TypeError, common.compose)
@@ -1,11 +1,27 @@
 #!/usr/bin/env python
 
-from dhaffner import functions
+from dhaffner import functions, iterators, profiling
 
+import asyncio
 import random
+import threading
 import unittest
 import time
 import operator
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def power(x):
+    return x ** 2
 
 
 class TestAtomize(unittest.TestCase):
@@ -59,6 +75,36 @@ class TestFunctions(unittest.TestCase):
         self.assertTrue(callable(f(1)))
         self.assertTrue(f(1)(2) == 3)
 
+    def test_method_decorators(self):
+        class A(object):
+            base = 10
+
+            @functions.curry
+            def add(self, x, y):
+                return self.base + x + y
+
+            @functions.flip
+            def sub(x, y, self):
+                return x - y
+
+            @functions.lift
+            def total(x, y):
+                return x + y
+
+            def __iter__(self):
+                return iter((1, 2))
+
+            where = functions.compose(type, functions.identity)
+
+        a = A()
+        self.assertEqual(a.add(1, 2), 13)
+        self.assertEqual(a.add(1)(2), 13)
+        self.assertEqual(A.add(a, 1, 2), 13)
+        self.assertEqual(a.sub(1, 3), 2)
+        self.assertEqual(a.total(), 3)
+        self.assertIs(a.where(), A)
+        self.assertEqual(A.sub.__name__, 'sub')
+
     def test_identity(self):
         self.assertTrue(functions.identity(1) == 1)
 
@@ -73,7 +119,54 @@ class TestFunctions(unittest.TestCase):
         lst2 = list(functions.scan(f, [1, 2, 3]))
 
         self.assertEqual(lst1, [0, 1, 3, 6])
-        self.assertEqual(lst2, [2, 4, 7])
+        self.assertEqual(lst2, [1, 3, 6])
+
+        lst3 = list(functions.scan(operator.mul, iter([1, 2, 3, 4])))
+        self.assertEqual(lst3, [1, 2, 6, 24])
+        self.assertEqual(list(functions.scan(max, [], 5)), [5])
+
+    def test_checkpointed_scan(self):
+        data = list(range(1, 11))
+        expected = list(functions.scan(operator.add, data, 100))
+
+        s = functions.checkpointed_scan(operator.add, data, 100)
+        head = list(islice(s, 4))
+        checkpoint = s.checkpoint()
+        self.assertEqual(checkpoint, (3, expected[3]))
+
+        resumed = functions.checkpointed_scan(operator.add, data,
+                                              checkpoint=checkpoint)
+        self.assertEqual(head + list(resumed), expected)
+
+        rest = iter(data[3:])
+        resumed = functions.checkpointed_scan(operator.add, rest,
+                                              checkpoint=checkpoint,
+                                              skip=False)
+        self.assertEqual(head + list(resumed), expected)
+
+        s = functions.checkpointed_scan(operator.add, data)
+        self.assertEqual(list(s), list(functions.scan(operator.add, data)))
+        self.assertEqual(s.checkpoint(), (10, 55))
+
+    def test_parallel_scan(self):
+        data = list(range(1, 1001))
+        for chunksize in (None, 1, 7, 1000, 5000):
+            self.assertEqual(
+                functions.parallel_scan(operator.add, data, chunksize),
+                list(functions.scan(operator.add, data))
+            )
+        self.assertEqual(functions.parallel_scan(max, [3, 1, 4, 1, 5], 2),
+                         [3, 3, 4, 4, 5])
+        self.assertEqual(functions.parallel_scan(operator.add, []), [])
+
+    @unittest.skipUnless(numpy, 'numpy is not installed')
+    def test_scan_numpy(self):
+        a = numpy.arange(1, 1001)
+        expected = list(functions.scan(operator.add, a.tolist()))
+        self.assertEqual(list(functions.scan(operator.add, a)), expected)
+        self.assertEqual(
+            functions.parallel_scan(operator.add, a, 7).tolist(), expected
+        )
 
     def test_vectorize(self):
         f = functions.vectorize(lambda a: a)
@@ -130,6 +223,35 @@ class TestFunctionsComposable(unittest.TestCase):
         f = functions.composable(func)
         self.assertEqual((f ** 2)(1), 4)
         self.assertEqual((f ** 3)(1), 8)
+        self.assertEqual((f ** 0)(1), 1)
+
+        # stopping early at a cycle is opt-in, through iterate_n
+        g = functions.composable(lambda x: (x + 3) % 10)
+        power = partial(iterators.iterate_n, g, n=10 ** 15 + 1, detect=True)
+        self.assertEqual(power(0), 3)
+        self.assertEqual(power(0, memo=True), 3)
+
+    def test_iterate_mutating(self):
+        def push(lst):
+            lst.append(1)
+            return lst
+
+        self.assertEqual((functions.composable(push) ** 5)([]), [1] * 5)
+
+    def test_affine(self):
+        f = functions.affine(2, 1)
+        self.assertEqual(f(3), 7)
+        self.assertEqual((f << f)(3), f(f(3)))
+        self.assertTrue(isinstance(f >> functions.affine(3), functions.affine))
+        self.assertEqual((f >> functions.affine(3))(1), 9)
+        self.assertEqual((f >> str)(1), '3')
+
+        x = 5
+        for _ in range(100):
+            x = f(x)
+        self.assertEqual((f ** 100)(5), x)
+        self.assertEqual((f ** 0)(5), 5)
+        self.assertEqual(repr(f ** 2), 'affine(4, 3)')
 
     def test_getattr(self):
         def func(x):
@@ -137,6 +259,7 @@ class TestFunctionsComposable(unittest.TestCase):
 
         f = functions.composable(func)
         self.assertEqual((f . str)('blah'), 'blahblah')
+        self.assertEqual((f . power)(3), 36)
         self.assertRaises(NameError, lambda: f . NonExistantName)
 
     def test_repr(self):
@@ -155,5 +278,257 @@ class TestFunctionsComposable(unittest.TestCase):
         self.assertRaises(NameError, lambda: func . nonexistantfuncname)
 
 
+class Backend(object):
+    """In-process stand-in for a store with a bulk lookup API."""
+    def __init__(self, delay=0.01):
+        self.delay, self.requests = delay, []
+
+    def get_many(self, keys):
+        self.requests.append(list(keys))
+        time.sleep(self.delay)
+        return [KeyError(key) if key < 0 else key * 2 for key in keys]
+
+    async def aget_many(self, keys):
+        self.requests.append(list(keys))
+        await asyncio.sleep(self.delay)
+        return [KeyError(key) if key < 0 else key * 2 for key in keys]
+
+
+class TestBatched(unittest.TestCase):
+
+    def test_threads(self):
+        backend = Backend()
+        get = functions.batched(backend.get_many, max_size=8, max_wait=0.05)
+        with ThreadPoolExecutor(20) as pool:
+            results = list(pool.map(get, range(40)))
+        self.assertEqual(results, [key * 2 for key in range(40)])
+        self.assertLess(len(backend.requests), 40)
+        self.assertEqual(sorted(chain.from_iterable(backend.requests)),
+                         list(range(40)))
+
+        stats = get.stats()
+        self.assertEqual(stats.calls, 40)
+        self.assertEqual(stats.batches, len(backend.requests))
+        self.assertEqual(sum(size * count
+                             for size, count in stats.sizes.items()), 40)
+        self.assertLessEqual(max(stats.sizes), 8)
+        self.assertEqual(sum(stats.waits.values()), stats.batches)
+
+    def test_errors(self):
+        backend = Backend(delay=0)
+        get = functions.batched(backend.get_many, max_size=4, max_wait=0.05)
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(get, key) for key in (1, -1, 2, -2)]
+        self.assertEqual(futures[0].result(), 2)
+        self.assertRaises(KeyError, futures[1].result)
+        self.assertEqual(futures[2].result(), 4)
+
+        def broken(keys):
+            raise IOError('down')
+
+        get = functions.batched(broken, max_size=2, max_wait=0.05)
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(get, key) for key in (1, 2)]
+        for future in futures:
+            self.assertRaises(IOError, future.result)
+
+        get = functions.batched(lambda keys: [], max_size=1)
+        self.assertRaises(ValueError, get, 1)
+        self.assertRaises(ValueError, functions.batched, abs, max_size=0)
+
+    def test_single(self):
+        get = functions.batched(Backend(delay=0).get_many, max_wait=0)
+        self.assertEqual(get(3), 6)
+        self.assertEqual(get.stats().sizes, {1: 1})
+
+    def test_asyncio(self):
+        backend = Backend()
+        get = functions.async_batched(backend.aget_many, max_size=8,
+                                      max_wait=0.05)
+
+        async def run():
+            return await asyncio.gather(*map(get, range(20)),
+                                        get(-1), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertEqual(results[:20], [key * 2 for key in range(20)])
+        self.assertTrue(isinstance(results[20], KeyError))
+        self.assertEqual([len(r) for r in backend.requests], [8, 8, 5])
+        self.assertEqual(get.stats().sizes, {8: 2, 5: 1})
+
+    def test_asyncio_abandoned_loop(self):
+        backend = Backend()
+        get = functions.async_batched(backend.aget_many, max_wait=0.1)
+
+        async def timeout():
+            return await asyncio.wait_for(get(1), 0.01)
+
+        self.assertRaises(asyncio.TimeoutError, asyncio.run, timeout())
+        self.assertEqual(asyncio.run(get(2)), 4)
+
+
+class TestPooledContext(unittest.TestCase):
+
+    def setUp(self):
+        self.made = []
+
+    def factory(self, size=4):
+        buf = bytearray(size)
+        self.made.append(buf)
+        return buf
+
+    def test_reuse(self):
+        pool = functions.pooled_context(self.factory, 8, maxsize=2)
+        for _ in range(5):
+            with pool as buf:
+                self.assertEqual(len(buf), 8)
+        self.assertEqual(len(self.made), 1)
+
+        with pool as a:
+            with pool as b:
+                self.assertIsNot(a, b)
+                self.assertEqual(pool.stats().utilization, 1.0)
+            with pool as c:
+                self.assertIs(b, c)
+        stats = pool.stats()
+        self.assertEqual((stats.size, stats.in_use, stats.idle), (2, 0, 2))
+        self.assertEqual((stats.created, stats.reused, stats.peak), (2, 6, 2))
+
+    def test_threads(self):
+        pool = functions.pooled_context(self.factory, maxsize=3)
+        lock, busy, clashes = threading.Lock(), set(), []
+
+        def use(_):
+            with pool as buf:
+                with lock:
+                    if id(buf) in busy:
+                        clashes.append(buf)
+                    busy.add(id(buf))
+                time.sleep(0.001)
+                with lock:
+                    busy.discard(id(buf))
+
+        with ThreadPoolExecutor(12) as executor:
+            list(executor.map(use, range(120)))
+        self.assertEqual(clashes, [])
+        self.assertLessEqual(len(self.made), 3)
+        self.assertEqual(pool.stats().in_use, 0)
+
+    def test_exhausted(self):
+        pool = functions.pooled_context(self.factory, maxsize=1, block=False)
+        with pool:
+            self.assertRaises(RuntimeError, pool.__enter__)
+        with pool:
+            pass
+
+        pool = functions.pooled_context(self.factory, maxsize=1, timeout=0.05)
+        with pool:
+            start = time.time()
+            self.assertRaises(RuntimeError, pool.acquire)
+            self.assertLess(0.04, time.time() - start)
+        self.assertEqual(pool.stats().exhausted, 1)
+
+    def test_discard(self):
+        disposed = []
+        pool = functions.pooled_context(self.factory, idle_timeout=0.01,
+                                        dispose=disposed.append)
+        with pool:
+            pass
+        time.sleep(0.02)
+        with pool:
+            pass
+        self.assertEqual(len(self.made), 2)
+        self.assertEqual(disposed, self.made[:1])
+
+        pool = functions.pooled_context(self.factory, validate=any)
+        with pool as buf:
+            buf[0] = 1
+        with pool as buf:
+            buf[0] = 0
+        with pool as buf:
+            pass
+        self.assertEqual(len(self.made), 4)
+        self.assertEqual(pool.stats().discarded, 1)
+        pool.close()
+        self.assertEqual(pool.stats().size, 0)
+
+    def test_factory_error(self):
+        pool = functions.pooled_context(lambda: 1 / 0, maxsize=1)
+        self.assertRaises(ZeroDivisionError, pool.__enter__)
+        self.assertEqual(pool.stats().size, 0)
+
+    def test_asyncio(self):
+        pool = functions.pooled_context(self.factory, maxsize=3)
+
+        async def use(i):
+            async with pool as buf:
+                buf[0] = i
+                await asyncio.sleep(0.001)
+                return buf[0] == i
+
+        async def run():
+            return await asyncio.gather(*map(use, range(30)))
+
+        self.assertTrue(all(asyncio.run(run())))
+        stats = pool.stats()
+        self.assertEqual((stats.created, stats.peak, stats.in_use), (3, 3, 0))
+        self.assertEqual(stats.waits, 27)
+
+    def test_asyncio_timeout(self):
+        pool = functions.pooled_context(self.factory, maxsize=1, timeout=0.01)
+
+        async def run():
+            async with pool:
+                with self.assertRaises(RuntimeError):
+                    async with pool:
+                        pass
+            async with pool:
+                return True
+
+        self.assertTrue(asyncio.run(run()))
+
+
+def _call(func, *args):
+    return func(*args)
+
+
+@unittest.skipIf(profiling.enabled(), 'instrumented stages do not pickle')
+class TestPickle(unittest.TestCase):
+
+    def setUp(self):
+        composable = functions.composable
+        self.cases = [
+            (functions.compose(abs, operator.neg), (3,), 3),
+            (functions.compose(str, abs, operator.neg), (3,), '3'),
+            (functions.composable(abs) + operator.neg, (-3,), 6),
+            (composable(abs) << operator.neg >> str, (3,), '3'),
+            (functions.composable(abs) ** 2, (-3,), 3),
+            (functions.affine(2, 1) ** 3, (1,), 15),
+            (functions.curry(operator.add)(1), (2,), 3),
+            (functions.flip(operator.sub), (2, 1), -1),
+            (functions.lift(operator.add), ((1, 2),), 3),
+            (functions.compose(list, functions.juxt(abs, str)), (-1,),
+             [1, '-1']),
+            (functions.constant('A'), (1, 2), 'A')
+        ]
+
+    def test_round_trip(self):
+        for func, args, expected in self.cases:
+            copy = pickle.loads(pickle.dumps(func))
+            self.assertEqual(copy(*args), expected)
+
+    def test_worker(self):
+        with ProcessPoolExecutor(1) as pool:
+            futures = [pool.submit(_call, func, *args)
+                       for func, args, _ in self.cases]
+            self.assertEqual([f.result() for f in futures],
+                             [expected for _, _, expected in self.cases])
+
+    def test_wraps(self):
+        self.assertEqual(functions.flip(operator.sub).__name__, 'sub')
+        self.assertEqual(functions.lift(operator.add).__wrapped__,
+                         operator.add)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,11 @@ from dhaffner import iterators
 
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class TestIterators(unittest.TestCase):
     def setUp(self):
@@ -37,6 +42,48 @@ class TestIterators(unittest.TestCase):
         p = iterators.dotproduct(v1, v2)
         self.assertTrue(p == 690)
 
+        from array import array
+        a1, a2 = array('d', v1), array('d', v2)
+        self.assertEqual(iterators.dotproduct(a1, a2), 690.0)
+        self.assertEqual(iterators.dotproduct(list(v1), tuple(v2)), 690)
+
+        sparse = {0: 2, 5: 3, 100: 7}
+        self.assertEqual(iterators.dotproduct(sparse, {5: 2, 6: 1}), 6)
+        self.assertEqual(iterators.dotproduct({5: 2, 6: 1}, sparse), 6)
+        self.assertEqual(iterators.dotproduct({0: 1, 3: 2}, v1), 9)
+        self.assertEqual(iterators.dotproduct(v1, {0: 1, 3: 2}), 9)
+
+    @unittest.skipUnless(iterators.sumprod, 'needs math.sumprod')
+    def test_dotproduct_sumprod(self):
+        from array import array
+        # sumprod accumulates exactly; a naive float sum loses the 1.0
+        v1, v2 = [1e20, 1.0, -1e20], [1.0, 1.0, 1.0]
+        self.assertEqual(iterators.dotproduct(v1, v2), 1.0)
+        self.assertEqual(iterators.dotproduct(tuple(v1), array('d', v2)),
+                         1.0)
+        self.assertEqual(iterators.dotproducts([v1, v2], v2), [1.0, 3.0])
+
+    def test_dotproducts(self):
+        matrix = [[1, 0, 0], [0, 1, 0], [1, 1, 1], {2: 5}]
+        vector = [3, 4, 5]
+        self.assertEqual(iterators.dotproducts(matrix, vector),
+                         [3, 4, 12, 25])
+        self.assertEqual(iterators.dotproducts(matrix, {1: 1}), [0, 1, 1, 0])
+        self.assertEqual(iterators.most_similar(matrix, vector, 2),
+                         [(3, 25), (2, 12)])
+        self.assertEqual(len(iterators.most_similar(matrix, vector)), 4)
+
+    @unittest.skipUnless(numpy, 'numpy is not installed')
+    def test_dotproduct_numpy(self):
+        matrix = numpy.array([[1, 0, 0], [0, 1, 0], [1, 1, 1], [0, 0, 5]])
+        vector = numpy.array([3, 4, 5])
+        self.assertEqual(iterators.dotproduct(matrix[2], vector), 12)
+        self.assertEqual(iterators.dotproducts(matrix, vector).tolist(),
+                         [3, 4, 12, 25])
+        self.assertEqual(iterators.most_similar(matrix, vector, 2),
+                         [(3, 25), (2, 12)])
+        self.assertEqual(len(iterators.most_similar(matrix, vector, 10)), 4)
+
     def test_drop(self):
         gen = iterators.drop(range(10), 1)
         self.assertTrue(next(gen) == 1)
@@ -66,6 +113,79 @@ class TestIterators(unittest.TestCase):
         flat_lst = list(iterators.flatten(lst))
         self.assertTrue(len(flat_lst) == 60)
 
+        nested = [1, [2, (3, [4, 'five']), b'six'], {'seven': 7}, iter([8])]
+        self.assertEqual(list(iterators.flatten(nested)),
+                         [1, 2, 3, 4, 'five', b'six', {'seven': 7}, 8])
+        self.assertEqual(list(iterators.flatten([1, [2, [3, [4]]]], 2)),
+                         [1, 2, 3, [4]])
+        self.assertEqual(list(iterators.flatten([[1], [2]], 0)), [[1], [2]])
+        self.assertEqual(list(iterators.flatten([{'a': 1}], atoms=(str,))),
+                         ['a'])
+        self.assertEqual(list(iterators.flatten([(1, 2), [3]], atoms=tuple)),
+                         [(1, 2), 3])
+
+        deep = [0]
+        for i in range(1, 10000):
+            deep = [deep, i]
+        self.assertEqual(list(iterators.flatten(deep)), list(range(10000)))
+
+    def test_hash_join(self):
+        users = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+        events = [{'id': 2, 'e': 'x'}, {'id': 3, 'e': 'y'},
+                  {'id': 1, 'e': 'z'}, {'id': 2, 'e': 'w', 'name': 'B'}]
+
+        joined = list(iterators.hash_join(users, events, 'id'))
+        self.assertEqual(joined, [
+            {'id': 2, 'name': 'b', 'e': 'x'},
+            {'id': 1, 'name': 'a', 'e': 'z'},
+            {'id': 2, 'name': 'B', 'e': 'w'},
+        ])
+        swapped = list(iterators.hash_join(events, users, 'id'))
+        self.assertEqual(sorted(map(sorted, map(dict.items, swapped))),
+                         sorted(map(sorted, map(dict.items, [
+                             {'id': 1, 'name': 'a', 'e': 'z'},
+                             {'id': 2, 'name': 'b', 'e': 'x'},
+                             {'id': 2, 'name': 'b', 'e': 'w'}]))))
+
+        streamed = iterators.hash_join(iter(users), iter(events), ('id',))
+        self.assertEqual(iterators.ilen(streamed), 3)
+
+    def test_group_aggregate(self):
+        rows = [{'k': i % 3, 'j': i % 2, 'x': i} for i in range(12)]
+        aggs = {'x': 'sum', 'n': ('x', 'count'), 'lo': ('x', 'min'),
+                'hi': ('x', 'max'), 'avg': ('x', 'mean'),
+                'a': ('x', 'first'), 'z': ('x', 'last')}
+        result = list(iterators.group_aggregate(rows, 'k', aggs))
+        self.assertEqual(result[0], {'k': 0, 'x': 18, 'n': 4, 'lo': 0,
+                                     'hi': 9, 'avg': 4.5, 'a': 0, 'z': 9})
+        self.assertEqual([r['k'] for r in result], [0, 1, 2])
+
+        pairs = iterators.group_aggregate(rows, ('k', 'j'), {'n': 'count'})
+        self.assertEqual(len(list(pairs)), 6)
+
+        self.assertRaises(ValueError, iterators.group_aggregate, rows, 'k',
+                          {'x': 'p99'})
+
+    def test_group_aggregate_spill(self):
+        import random
+        rows = [{'k': random.randrange(200), 'x': 1} for _ in range(2000)]
+        expected = dict((r['k'], r['n']) for r in iterators.group_aggregate(
+            rows, 'k', {'n': ('x', 'sum')}))
+        for max_groups in (5, 50):
+            spilled = list(iterators.group_aggregate(
+                iter(rows), 'k', {'n': ('x', 'sum')}, max_groups, 4))
+            self.assertEqual(len(spilled), len(expected))
+            self.assertEqual(dict((r['k'], r['n']) for r in spilled),
+                             expected)
+
+    def test_group_aggregate_errors(self):
+        rows = [{'k': 1, 'x': 1}]
+        for max_groups in (0, -1):
+            self.assertRaises(ValueError, iterators.group_aggregate, rows,
+                              'k', {'x': 'sum'}, max_groups)
+        self.assertRaises(ValueError, iterators.group_aggregate, rows, 'k',
+                          {'x': 'median'})
+
     def test_ilen(self):
         self.assertTrue(iterators.ilen(range(100)) == 100)
         self.assertTrue(iterators.ilen(['a', 'b', 'c']) == 3)
@@ -84,10 +204,102 @@ class TestIterators(unittest.TestCase):
         self.assertEqual(next(f), 4)
         self.assertEqual(next(f), 16)
 
+    def test_iterate_n(self):
+        calls = []
+
+        def f(x):
+            calls.append(x)
+            return (x * x + 1) % 255
+
+        mu, lam = iterators.find_cycle(f, 3)
+        n = 10 ** 12
+        expected = 3
+        for _ in range(1000):
+            expected = (expected * expected + 1) % 255
+
+        for memo in (False, True):
+            del calls[:]
+            self.assertEqual(iterators.iterate_n(f, 3, 1000, detect=True,
+                                                 memo=memo), expected)
+            self.assertLess(len(calls), 100)
+            self.assertEqual(
+                iterators.iterate_n(f, 3, n, detect=True, memo=memo),
+                iterators.iterate_n(f, 3, mu + (n - mu) % lam))
+
+        del calls[:]
+        self.assertEqual(iterators.iterate_n(f, 3, 1000), expected)
+        self.assertEqual(len(calls), 1000)
+
+        self.assertEqual(iterators.iterate_n(f, 3, 0), 3)
+        self.assertEqual(iterators.iterate_n(f, 3, 1, detect=True), 10)
+        self.assertEqual(iterators.iterate_n(lambda x: x * 2, 1, 10), 1024)
+        self.assertEqual(iterators.iterate_n(lambda x: x * 2, 1, 10,
+                                             detect=True, memo=True), 1024)
+
+        def push(lst):
+            lst.append(1)
+            return lst
+
+        self.assertEqual(iterators.iterate_n(push, [], 5), [1] * 5)
+
+    def test_find_cycle(self):
+        f = lambda x: (x * x + 1) % 255
+        mu, lam = iterators.find_cycle(f, 3)
+        states = list(iterators.take(mu + 2 * lam, iterators.cons(
+            3, iterators.iterate(f, 3))))
+        self.assertEqual(states[mu], states[mu + lam])
+        self.assertEqual(len(set(states[mu:mu + lam])), lam)
+        self.assertEqual(len(set(states[:mu + lam])), mu + lam)
+
+    def test_until_fixed_point(self):
+        sqrt2 = iterators.until_fixed_point(
+            lambda x: (x + 2 / x) / 2, 1.0, eq=lambda a, b: abs(a - b) < 1e-12
+        )
+        self.assertAlmostEqual(sqrt2, 2 ** 0.5)
+        self.assertEqual(iterators.until_fixed_point(lambda x: x // 2, 100), 0)
+        self.assertRaises(RuntimeError, iterators.until_fixed_point,
+                          lambda x: x + 1, 0, limit=10)
+
     def test_last(self):
         lst = [10, 20, 30]
         self.assertTrue(iterators.last(lst) == 30)
 
+    def test_merge(self):
+        a, b, c = [1, 4, 7, 7], [2, 4, 8], iter([0, 9])
+        self.assertEqual(list(iterators.merge(a, b, c)),
+                         [0, 1, 2, 4, 4, 7, 7, 8, 9])
+        self.assertEqual(list(iterators.merge(['bb', 'a'], ['ccc'], key=len,
+                                              reverse=True)),
+                         ['ccc', 'bb', 'a'])
+
+    def test_merge_unique(self):
+        a, b = [1, 4, 7, 7], [2, 4, 8]
+        self.assertEqual(list(iterators.merge_unique(a, b)), [1, 2, 4, 7, 8])
+        self.assertEqual(list(iterators.merge_unique(['a', 'bb'], ['c', 'dd'],
+                                                     key=len)), ['a', 'bb'])
+        self.assertEqual(list(iterators.merge_unique()), [])
+
+    def test_merge_join(self):
+        left = [(1, 'a'), (2, 'b'), (2, 'c'), (4, 'd')]
+        right = [(2, 'x'), (2, 'y'), (3, 'z'), (5, 'w')]
+        key = lambda r: r[0]
+
+        def join(how):
+            pairs = iterators.merge_join(iter(left), iter(right), key, how)
+            return [(l and l[1], r and r[1]) for l, r in pairs]
+
+        inner = [('b', 'x'), ('b', 'y'), ('c', 'x'), ('c', 'y')]
+        self.assertEqual(join('inner'), inner)
+        self.assertEqual(join('left'), [('a', None)] + inner + [('d', None)])
+        self.assertEqual(join('right'),
+                         inner + [(None, 'z'), (None, 'w')])
+        self.assertEqual(join('outer'), [('a', None)] + inner +
+                         [(None, 'z'), ('d', None), (None, 'w')])
+        self.assertEqual(list(iterators.merge_join([], [1], how='right')),
+                         [(None, 1)])
+        self.assertRaises(ValueError, iterators.merge_join, [], [],
+                          how='cross')
+
     def test_nth(self):
         lst = [10, 20, 30]
         self.assertTrue(iterators.nth(lst, 1) == 20)
@@ -101,6 +313,76 @@ class TestIterators(unittest.TestCase):
         D = [next(fit) - next(tit)] * 500
         self.assertTrue(D.count(1) == 500)
 
+    def test_partition_spill(self):
+        odd, even = iterators.partition(range(10000), lambda x: x % 2 == 0,
+                                        memory_limit=100)
+        self.assertEqual(list(odd), list(range(1, 10000, 2)))
+        self.assertEqual(list(even), list(range(0, 10000, 2)))
+
+    def test_replayable(self):
+        import tempfile
+        from itertools import islice
+        with tempfile.TemporaryDirectory() as spill_dir:
+            buffer = iterators.replayable(iter(range(10000)),
+                                          memory_limit=1000,
+                                          spill_dir=spill_dir, chunksize=100)
+            first, second = buffer.cursor(), buffer.cursor()
+            self.assertEqual(list(first), list(range(10000)))
+            self.assertEqual((buffer.in_memory, buffer.spilled), (1000, 90))
+            self.assertEqual(len(buffer.segments), 1)
+
+            self.assertEqual(list(second), list(range(10000)))
+            self.assertEqual((buffer.in_memory, buffer.spilled), (0, 0))
+            self.assertRaises(ValueError, buffer.cursor)
+            buffer.close()
+
+        # spill files are rotated by size and closed once passed
+        buffer = iterators.replayable(range(100000), memory_limit=100,
+                                      chunksize=100)
+        buffer.segment_bytes = 4096
+        first, second = buffer.cursor(), buffer.cursor()
+        self.assertEqual(sum(first), sum(range(100000)))
+        segments = len(buffer.segments)
+        self.assertTrue(1 < segments < 1000)
+        self.assertEqual(sum(islice(second, 50000)), sum(range(50000)))
+        self.assertLess(len(buffer.segments), segments)
+        self.assertEqual(sum(second), sum(range(50000, 100000)))
+        self.assertEqual(len(buffer.segments), 1)
+
+        # cursors that advance together keep only the chunks between them
+        buffer = iterators.replayable(range(5000), memory_limit=500,
+                                      chunksize=64)
+        pairs = zip(buffer.cursor(), buffer.cursor())
+        for i, (a, b) in enumerate(pairs):
+            self.assertEqual(a, b)
+            self.assertLessEqual(buffer.in_memory, 128)
+        self.assertEqual((i, buffer.spilled), (4999, 0))
+
+        # and close the spill files they have passed in lockstep
+        buffer = iterators.replayable(range(100000), memory_limit=10,
+                                      chunksize=10)
+        buffer.segment_bytes = 1000
+        pairs = zip(buffer.cursor(), buffer.cursor())
+        for a, b in islice(pairs, 40000):
+            self.assertEqual(a, b)
+            self.assertLessEqual(len(buffer.segments), 2)
+        self.assertGreater(buffer.spilled, 0)
+
+        # an abandoned cursor does not hold the buffer back
+        buffer = iterators.replayable(range(3000), memory_limit=100,
+                                      chunksize=10)
+        first, second = buffer.cursor(), buffer.cursor()
+        del second
+        self.assertEqual(sum(first), sum(range(3000)))
+        self.assertEqual(buffer.spilled, 0)
+
+        buffer = iterators.replayable(range(3000), memory_limit=100)
+        first, second = buffer.cursor(), buffer.cursor()
+        self.assertEqual(next(first), 0)
+        buffer.close()
+        self.assertEqual(len(list(first)), 99)
+        self.assertEqual(list(second), [])
+
     def test_pick(self):
         it = iterators.pick(range(10))
         iterators.consume(it, 10)
@@ -114,6 +396,145 @@ class TestIterators(unittest.TestCase):
         self.assertTrue(
             lst == [(), (0,), (1,), (2,), (0, 1), (0, 2), (1, 2), (0, 1, 2)]
         )
+        self.check_combinatoric(iterators.powerset('abcde'), 32)
+        self.assertEqual(iterators.powerset('abc').rank('ca'), 5)
+        self.assertEqual(len(iterators.powerset([])), 1)
+        self.assertEqual(iterators.powerset(range(100))[2 ** 100 - 1],
+                         tuple(range(100)))
+
+    def check_combinatoric(self, c, size):
+        expected = list(c)
+        self.assertEqual(len(c), size)
+        self.assertEqual(len(expected), size)
+        self.assertEqual([c[i] for i in range(size)], expected)
+        self.assertEqual([c.rank(e) for e in expected], list(range(size)))
+        self.assertEqual(c[-1], expected[-1])
+        self.assertRaises(IndexError, lambda: c[size])
+
+        for start in range(size):
+            self.assertEqual(list(c.iterfrom(start)), expected[start:])
+        self.assertEqual(list(c[3:-2]), expected[3:-2])
+        self.assertEqual(list(c[1::3]), expected[1::3])
+        self.assertEqual(c[2:][1:4][0], expected[3])
+        self.assertEqual(len(c[2:7]), 5)
+
+        shards = [list(c.shard(i, 3)) for i in range(3)]
+        self.assertEqual(sum(shards, []), expected)
+        self.assertTrue(expected[0] in c)
+        self.assertFalse(('nonexistant',) in c)
+
+    def test_combinations(self):
+        import itertools
+        c = iterators.combinations('abcdef', 3)
+        self.assertEqual(list(c), list(itertools.combinations('abcdef', 3)))
+        self.check_combinatoric(c, 20)
+        self.assertEqual(c.rank('fba'), c.rank('abf'))
+        self.assertRaises(ValueError, c.rank, 'aab')
+        self.assertEqual(len(iterators.combinations('ab', 3)), 0)
+
+    def test_permutations(self):
+        import itertools
+        p = iterators.permutations('abcde', 3)
+        self.assertEqual(list(p), list(itertools.permutations('abcde', 3)))
+        self.check_combinatoric(p, 60)
+        self.check_combinatoric(iterators.permutations(range(4)), 24)
+        self.assertRaises(ValueError, p.rank, 'aab')
+
+    def test_product(self):
+        import itertools
+        p = iterators.product('ab', range(3), 'xyz')
+        self.assertEqual(list(p), list(itertools.product('ab', range(3),
+                                                         'xyz')))
+        self.check_combinatoric(p, 18)
+        self.check_combinatoric(iterators.product([0, 1], repeat=4), 16)
+        self.assertRaises(ValueError, p.rank, ('a', 0))
+
+    def test_repeated_elements(self):
+        for c in [iterators.powerset('aab'),
+                  iterators.combinations('aabca', 2),
+                  iterators.permutations('aab'),
+                  iterators.product('aab', 'cc')]:
+            expected = list(c)
+            for e in expected:
+                self.assertTrue(e in c)
+                self.assertEqual(c.rank(e), expected.index(e))
+                self.assertEqual(c[c.rank(e)], e)
+        self.assertTrue(('a', 'a') in iterators.powerset('aab'))
+        self.assertFalse(('a', 'a', 'a') in iterators.powerset('aab'))
+        self.assertEqual(iterators.combinations([[1], [1]], 2).rank(
+            ([1], [1])), 0)
+
+    def test_reservoir_sample(self):
+        from collections import Counter
+
+        sample = iterators.reservoir_sample(iter(range(100000)), 10, seed=1)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(all(0 <= x < 100000 for x in sample))
+        self.assertEqual(sample,
+                         iterators.reservoir_sample(range(100000), 10, 1))
+        self.assertEqual(sorted(iterators.reservoir_sample('abc', 5)),
+                         ['a', 'b', 'c'])
+        self.assertEqual(iterators.reservoir_sample('abc', 0), [])
+
+        counts = Counter()
+        for seed in range(1000):
+            counts.update(iterators.reservoir_sample(range(10), 3, seed))
+        self.assertTrue(all(220 < n < 380 for n in counts.values()))
+
+    def test_reservoir_merge(self):
+        from collections import Counter
+
+        counts = Counter()
+        for seed in range(1000):
+            a = iterators.reservoir(3, seed).extend(range(5))
+            b = iterators.reservoir(3, seed + 1000)
+            for x in range(5, 15):
+                b.add(x)
+            merged = a.merge(b).extend(range(15, 20))
+            self.assertEqual(merged.count, 20)
+            self.assertEqual(len(merged), 3)
+            counts.update(merged)
+        self.assertEqual(len(counts), 20)
+        self.assertTrue(all(100 < n < 200 for n in counts.values()))
+
+        small = iterators.reservoir(5).extend('ab').merge(
+            iterators.reservoir(5).extend('c'))
+        self.assertEqual(sorted(small), ['a', 'b', 'c'])
+        empty = iterators.reservoir(0).extend('ab').merge(
+            iterators.reservoir(0).extend('c'))
+        self.assertEqual((list(empty), empty.count), ([], 3))
+        self.assertEqual(list(empty.extend('de')), [])
+        self.assertRaises(ValueError, iterators.reservoir(1).merge,
+                          iterators.reservoir(2))
+
+    def test_weighted_reservoir_sample(self):
+        from collections import Counter
+
+        weight = lambda x: x
+        counts = Counter()
+        for seed in range(1000):
+            sample = iterators.weighted_reservoir_sample(range(1, 5), 1,
+                                                         weight, seed)
+            counts.update(sample)
+        self.assertTrue(counts[4] > counts[2] > counts[1])
+        self.assertTrue(300 < counts[4] < 500)
+
+        sample = iterators.weighted_reservoir_sample(range(1, 1000), 10,
+                                                     weight, seed=3)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertEqual(
+            sorted(iterators.weighted_reservoir_sample('ab', 5, len)),
+            ['a', 'b']
+        )
+
+        for seed in range(20):
+            sample = iterators.weighted_reservoir_sample(range(-3, 6), 3,
+                                                         weight, seed)
+            self.assertEqual(len(sample), 3)
+            self.assertTrue(all(x > 0 for x in sample))
+        self.assertEqual(
+            iterators.weighted_reservoir_sample([0, 0, 2], 5, weight), [2]
+        )
 
     def test_split(self):
         head, tail = iterators.split(range(10))
@@ -125,6 +546,48 @@ class TestIterators(unittest.TestCase):
         self.assertTrue(iterators.last(lst) == 9)
         self.assertEqual(iterators.last([1]), 1)
 
+    def test_topk(self):
+        import random
+        data = [random.randrange(1000) for _ in range(5000)]
+        self.assertEqual(iterators.topk(iter(data), 10),
+                         sorted(data, reverse=True)[:10])
+
+        records = [(x, i) for i, x in enumerate(data)]
+        key = lambda r: r[0] % 100
+        self.assertEqual(iterators.topk(records, 50, key),
+                         sorted(records, key=key, reverse=True)[:50])
+        self.assertEqual(iterators.topk([3, 1, 2], 5), [3, 2, 1])
+        self.assertEqual(iterators.topk([3, 1, 2], 0), [])
+        self.assertEqual(iterators.topk([], 3, key), [])
+
+    def test_external_sort(self):
+        import random
+        data = [(random.randrange(100), i) for i in range(2000)]
+        key = lambda r: r[0]
+        for limit in (7, 500, 2000, 10 ** 6):
+            self.assertEqual(
+                list(iterators.external_sort(iter(data), key,
+                                             memory_limit=limit)),
+                sorted(data, key=key)
+            )
+        self.assertEqual(
+            list(iterators.external_sort(data, key, True, 100)),
+            sorted(data, key=key, reverse=True)
+        )
+        self.assertEqual(list(iterators.external_sort([], memory_limit=1)),
+                         [])
+        for fan_in in (2, 3):
+            self.assertEqual(
+                list(iterators.external_sort(data, key, memory_limit=50,
+                                             fan_in=fan_in)),
+                sorted(data, key=key)
+            )
+        self.assertRaises(ValueError, iterators.external_sort, data,
+                          fan_in=1)
+        for limit in (0, -1):
+            self.assertRaises(ValueError, iterators.external_sort, [3, 1, 2],
+                              memory_limit=limit)
+
     def test_unique(self):
         it = iterators.unique([10, 20, 30, 40, 50] * 3)
         self.assertTrue(iterators.ilen(it) == 5)
@@ -139,6 +602,99 @@ class TestIterators(unittest.TestCase):
         c = iterators.with_iter(f())
         self.assertTrue(next(c) == 12)
 
+    def test_with_iter_prefetch(self):
+        import threading
+        import time
+        from contextlib import contextmanager
+
+        events = []
+
+        @contextmanager
+        def f(iterable):
+            events.append('enter')
+            try:
+                yield iterable
+            finally:
+                events.append('exit')
+
+        c = iterators.with_iter(f(range(1000)), prefetch=8)
+        self.assertEqual(list(c), list(range(1000)))
+        self.assertEqual(events, ['enter', 'exit'])
+
+        del events[:]
+        c = iterators.with_iter(f(iterators.iterate(abs, 1)), prefetch=2)
+        self.assertEqual(next(c), 1)
+        c.close()
+        self.assertEqual(events, ['enter', 'exit'])
+        for thread in threading.enumerate():
+            if thread.name == 'dhaffner.prefetch':
+                thread.join(5)
+                self.assertFalse(thread.is_alive())
+
+        # closing does not wait for a read in progress
+        release = threading.Event()
+
+        def slow():
+            yield 1
+            release.wait(5)
+            yield 2
+
+        del events[:]
+        c = iterators.with_iter(f(slow()), prefetch=1)
+        self.assertEqual(next(c), 1)
+        start = time.time()
+        c.close()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(events, ['enter', 'exit'])
+        release.set()
+
+        def fails():
+            yield 1
+            raise KeyError('boom')
+
+        c = iterators.with_iter(f(fails()), prefetch=4)
+        self.assertEqual(next(c), 1)
+        self.assertRaises(KeyError, next, c)
+
+    def test_with_iter_blocksize(self):
+        import os
+        import tempfile
+
+        lines = ['line {}\n'.format(i) for i in range(5000)] + ['last']
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(lines)
+            for prefetch in (0, 3):
+                it = iterators.with_iter(open(path), prefetch, 4096)
+                self.assertEqual(list(it), lines)
+            it = iterators.with_iter(open(path, 'rb'), blocksize=100)
+            self.assertEqual(next(it), b'line 0\n')
+            it.close()
+        finally:
+            os.remove(path)
+
+    def test_prefetch(self):
+        import threading
+        import time
+
+        it = iterators.prefetch(iter(range(10)), 3)
+        self.assertEqual(list(it), list(range(10)))
+
+        release = threading.Event()
+
+        def slow():
+            yield 1
+            release.wait(5)
+            yield 2
+
+        it = iterators.prefetch(slow(), timeout=0.1)
+        self.assertEqual(next(it), 1)
+        start = time.time()
+        it.close()
+        self.assertLess(time.time() - start, 1)
+        release.set()
+
     def test_where(self):
         d1 = {'a': 1, 'b': 2, 'c': 3, 'd': 33}
         d2 = {'a': 10, 'b': 2, 'c': 3, 'd': 8}
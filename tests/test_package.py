@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import subprocess
+import sys
+import unittest
+
+
+def imported_after(statement):
+    """Return the set of modules loaded after running statement in a fresh
+    interpreter."""
+    code = '{}\nimport sys\nprint(" ".join(sys.modules))'.format(statement)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return set(output.decode().split())
+
+
+class TestPackage(unittest.TestCase):
+
+    def test_lazy_submodules(self):
+        modules = imported_after('import dhaffner')
+        self.assertIn('dhaffner', modules)
+        self.assertFalse([m for m in modules if m.startswith('dhaffner.')])
+
+    def test_getattr(self):
+        import dhaffner
+        self.assertTrue(callable(dhaffner.iterators.first))
+        self.assertIn('misc', dir(dhaffner))
+        self.assertRaises(AttributeError, lambda: dhaffner.nonexistant)
+
+    def test_builtins_decoupled(self):
+        modules = imported_after('import dhaffner.builtins')
+        self.assertNotIn('dhaffner.functions', modules)
+
+    def test_functions_defers_stdlib(self):
+        modules = imported_after('import dhaffner.functions')
+        for name in ('inspect', 'random', 'threading'):
+            self.assertNotIn(name, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+from dhaffner import common, functions, iterators, profiling
+
+import os
+import unittest
+
+
+def inc(x):
+    return x + 1
+
+
+def double(x):
+    return x * 2
+
+
+# Set for the whole process, profiling cannot be observed being off.
+needs_profiling_off = unittest.skipIf(profiling.enabled(),
+                                      'DHAFFNER_PROFILE is set')
+
+
+class TestProfiling(unittest.TestCase):
+
+    @needs_profiling_off
+    def test_disabled(self):
+        self.assertFalse(profiling.enabled())
+        f = common.compose(inc, double)
+        self.assertEqual(f(3), 7)
+        self.assertEqual(len(profiling.report()), 0)
+        self.assertFalse(hasattr(iterators.take(2, [1, 2]), 'gi_frame'))
+
+    def test_compose(self):
+        enabled = profiling.enabled()
+        with profiling.profile() as report:
+            f = common.compose(inc, double)
+            for x in range(10):
+                f(x)
+
+        self.assertEqual(profiling.enabled(), enabled)
+        self.assertEqual(report[profiling.stagename(inc)].calls, 10)
+        self.assertEqual(report[profiling.stagename(double)].calls, 10)
+        self.assertEqual(f(3), 7)
+
+    def test_juxt_pipe(self):
+        seen = []
+        with profiling.profile() as report:
+            list(functions.juxt(inc, double)(1))
+            functions.pipe(seen.append)(1)
+
+        self.assertEqual(seen, [1])
+        self.assertEqual(len(report), 3)
+
+    def test_composable(self):
+        with profiling.profile() as report:
+            f = functions.composable(inc) << double
+        self.assertEqual(f(1), 3)
+        self.assertEqual(report[profiling.stagename(inc)].calls, 1)
+
+    def test_iterators(self):
+        with profiling.profile() as report:
+            lst = list(iterators.take(3, iterators.compact(range(10))))
+
+        self.assertEqual(lst, [1, 2, 3])
+        self.assertEqual(report['compact'].items_in, 4)
+        self.assertEqual(report['compact'].items_out, 3)
+        take = report[profiling.stagename(iterators.take)]
+        self.assertEqual((take.calls, take.items_in, take.items_out),
+                         (1, 3, 3))
+
+    def test_environment(self):
+        from unittest import mock
+
+        for value, expected in [('', False), ('0', False), ('false', False),
+                                ('No', False), (' off ', False),
+                                ('1', True), ('yes', True)]:
+            with mock.patch.dict('os.environ', DHAFFNER_PROFILE=value):
+                self.assertIs(profiling._State().enabled, expected)
+        with mock.patch.dict('os.environ'):
+            os.environ.pop('DHAFFNER_PROFILE', None)
+            self.assertFalse(profiling._State().enabled)
+
+    @needs_profiling_off
+    def test_unwrapped_when_disabled(self):
+        take = iterators.take
+        self.assertFalse(hasattr(take, '__wrapped__'))
+        with profiling.profile():
+            self.assertIs(iterators.take.__wrapped__, take)
+            with profiling.profile():
+                self.assertIs(iterators.take.__wrapped__, take)
+            self.assertIs(iterators.take.__wrapped__, take)
+        self.assertIs(iterators.take, take)
+
+    def test_sink(self):
+        events = []
+        sink = lambda *event: events.append(event)
+        with profiling.profile(sink):
+            common.compose(inc)(1)
+        common.compose(inc)(1)
+
+        self.assertEqual(len(events), 1)
+        name, elapsed, items_in, items_out = events[0]
+        self.assertEqual(name, profiling.stagename(inc))
+        self.assertTrue(elapsed >= 0)
+
+    def test_str(self):
+        with profiling.profile() as report:
+            common.compose(inc)(1)
+        self.assertIn('inc', str(report))
+
+
+if __name__ == '__main__':
+    unittest.main()